@@ -1,9 +1,15 @@
+import os
+import hmac
+import time
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
-import os
-import re
-import zipfile
+from sales_labels import date_cn
+from sales_index import DATE_PRESETS, date_slice, preset_range
+from sales_refresh import RefreshService, format_age
+from sales_charts import trend_bucket, trend_figure, ranking_figure
+import sales_perf as perf
 
 # --- 🎨 頁面設定 ---
 st.set_page_config(page_title="峰揚行動查價系統", page_icon="📱", layout="wide")
@@ -55,160 +61,72 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# --- 🔍 核彈級檔案搜尋器 ---
-def find_file_recursive(target_names):
-    targets_lower = [t.lower() for t in target_names]
-    for root, dirs, files in os.walk("."):
-        for file in files:
-            if file.lower() in targets_lower:
-                return os.path.join(root, file)
-    return None
-
-# --- 🔥 數據載入引擎 ---
-@st.cache_data(show_spinner="🚀 正在全機掃描並載入數據，請稍候...", max_entries=1)
-def load_data_final():
-    try:
-        zip_path = find_file_recursive(['All_Sales_5Years.zip', 'All_Sales_5years.zip', 'all_sales_5years.zip'])
-        csv_path = find_file_recursive(['All_Sales_5Years.csv', 'All_Sales_2025_2026.csv'])
-        
-        df = None
-        
-        if zip_path:
-            try:
-                with zipfile.ZipFile(zip_path, 'r') as z:
-                    valid_files = [f for f in z.namelist() if f.lower().endswith('.csv') and not f.startswith('__')]
-                    if valid_files:
-                        target_csv = valid_files[0]
-                        with z.open(target_csv) as f:
-                            try: df = pd.read_csv(f, encoding='utf-8', low_memory=False)
-                            except: df = pd.read_csv(f, encoding='cp950', low_memory=False)
-            except Exception as e:
-                return None, f"Zip 讀取失敗: {str(e)}"
-        elif csv_path:
-            try: df = pd.read_csv(csv_path, encoding='utf-8', low_memory=False)
-            except: df = pd.read_csv(csv_path, encoding='cp950', low_memory=False)
-        else:
-            return None, "❌ 找不到資料檔 (CSV或ZIP)"
+# --- 🔥 數據載入引擎 (載入與更新都在背景執行緒，詳見 sales_refresh.py) ---
+@st.cache_resource
+def data_service():
+    return RefreshService()
 
-        if df is None: return None, "讀取後資料為空"
+service = data_service()
 
-        df['OUTDATE'] = pd.to_datetime(df['OUTDATE'], format='%Y%m%d', errors='coerce')
-        df = df.sort_values('OUTDATE')
-        df['日期_CN'] = df['OUTDATE'].dt.strftime('%Y年%m月%d日')
-        df['金額'] = pd.to_numeric(df['SUBTOT'], errors='coerce').fillna(0)
-        df['數量'] = pd.to_numeric(df['OUTQTY'], errors='coerce').fillna(0)
-        
-        best_code_col = None
-        priority_cols = [c for c in df.columns if c.upper() in ['IT_NO', 'ITEM_NO', 'P_NO', 'CODE', 'PROD_ID']]
-        if priority_cols: best_code_col = priority_cols[0]
-        else:
-            max_matches = 0
-            for col in df.select_dtypes(include=['object']).columns:
-                matches = df[col].astype(str).str.count(r'[a-zA-Z]+[\s-]*\d+').sum()
-                if matches > max_matches: max_matches = matches; best_code_col = col
-        
-        if best_code_col: 
-            def extract_smart_code(text):
-                text = str(text).strip()
-                match = re.search(r"([a-zA-Z]{1,4})[\s-]*(\d{1,5})", text)
-                if match: return f"{match.group(1)}{match.group(2)}"
-                return text[:5]
-            df['產品編號'] = df[best_code_col].apply(extract_smart_code)
-        else: df['產品編號'] = "Unknown"
-
-        title_candidates = [c for c in df.columns if c.upper() in ['TITLE', 'NAME', 'PROD_NAME', 'DESCRIPTION', 'C_NAME']]
-        best_name_col = title_candidates[0] if title_candidates else best_code_col
-        if best_name_col: df['產品名稱'] = df[best_name_col].astype(str)
-        else: df['產品名稱'] = df['產品編號']
-        df['產品全名'] = "[" + df['產品編號'] + "] " + df['產品名稱']
-
-        def split_prod_code(code):
-            match = re.search(r"([a-zA-Z]+)[\s-]*(\d+)", str(code))
-            return (match.group(1).upper(), int(match.group(2))) if match else ("N/A", 0)
-        df['Prefix'], df['ProdNum'] = zip(*df['產品編號'].apply(split_prod_code))
-
-        def super_clean(x):
-            if pd.isna(x): return "None"
-            s = str(x).strip()
-            if s.endswith('.0'): s = s[:-2]
-            return s
-        df['CUST_KEY'] = df['CUST_NO'].apply(super_clean)
-        df['SALES_KEY'] = df['SUBNO'].apply(super_clean)
-        
-        name_map = {}
-        lab_path = find_file_recursive(['LABORER.DBF', 'laborer.dbf', '勞工.DBF', '勞工.dbf'])
-        if lab_path:
-            try:
-                from dbfread import DBF
-                l_table = DBF(lab_path, encoding='cp950', char_decode_errors='ignore', ignore_missing_memofile=True)
-                l_df = pd.DataFrame(iter(l_table))
-                id_col = next((c for c in l_df.columns if c.upper() in ['SUBNO', 'SNO', 'S_NO', 'ID', 'K_NO']), None)
-                name_col = next((c for c in l_df.columns if c.upper() in ['NAME', 'NAME_C', 'L_NAME', 'SNAME']), None)
-                if id_col and name_col:
-                    l_df['clean_key'] = l_df[id_col].apply(super_clean)
-                    l_df['zfill_key'] = l_df[id_col].apply(super_clean).str.zfill(4)
-                    name_map = {**l_df.set_index('clean_key')[name_col].to_dict(), **l_df.set_index('zfill_key')[name_col].to_dict()}
-            except: pass
-
-        cust_map = {}
-        cust_info_map = {} 
-        cust_path = find_file_recursive(['CUST.DBF', 'cust.dbf', '客戶.DBF'])
-        if cust_path:
-            try:
-                from dbfread import DBF
-                c_table = DBF(cust_path, encoding='cp950', char_decode_errors='replace', ignore_missing_memofile=True)
-                c_df = pd.DataFrame(iter(c_table))
-                c_id_col = next((c for c in c_df.columns if c.upper() in ['CUST_NO', 'CNO', 'C_NO', 'K_NO', 'ID', 'CODE']), None)
-                c_na_col = next((c for c in c_df.columns if c.upper() in ['C_NA', 'NAME', 'C_NAME', 'COMPANY', 'CUST_NAME', 'TITLE']), None)
-                
-                tel_cols = [c for c in c_df.columns if c.upper() in ['TELE1', 'TELE2', 'TEL1', 'TEL2', 'COMP_TEL', 'CON_TEL', 'TEL']]
-                addr_cols = [c for c in c_df.columns if c.upper() in ['CARADD', 'INVOADD', 'SEND_ADDR', 'INVOICE_AD', 'C_ADDR1', 'C_ADDR']]
-                
-                if c_id_col and c_na_col:
-                    c_df['clean_key'] = c_df[c_id_col].apply(super_clean)
-                    c_df['clean_name'] = c_df[c_na_col].astype(str).str.strip()
-                    cust_map = c_df.set_index('clean_key')['clean_name'].to_dict()
-                    
-                    for _, row in c_df.iterrows():
-                        c_name = str(row['clean_name']) 
-                        if c_name in ["nan", "None", "NaN", ""]: continue
-                        
-                        c_tel = "系統無紀錄"
-                        for t_col in tel_cols:
-                            val = str(row[t_col]).strip()
-                            if val and val not in ["nan", "None", "NaN", ""]:
-                                c_tel = val
-                                break
-                                
-                        c_addr = "系統無紀錄"
-                        for a_col in addr_cols:
-                            val = str(row[a_col]).strip()
-                            if val and val not in ["nan", "None", "NaN", ""]:
-                                c_addr = val
-                                break
-                            
-                        cust_info_map[c_name] = {"電話": c_tel, "地址": c_addr}
-            except: pass
-
-        df['業務員'] = df['SALES_KEY'].map(name_map).fillna(df['SALES_KEY'])
-        mask_sales_fail = df['業務員'] == df['SALES_KEY']
-        if mask_sales_fail.any():
-             df.loc[mask_sales_fail, '業務員'] = df.loc[mask_sales_fail, 'SALES_KEY'].str.zfill(4).map(name_map).fillna(df.loc[mask_sales_fail, 'SALES_KEY'])
-        df['店家名稱'] = df['CUST_KEY'].map(cust_map).fillna(df['CUST_KEY'])
-        
-        return df, cust_info_map
+# 管理用網址：?status=<token> 只回傳快照狀態、?perf=<token> 開效能面板；沒設 SALES_ADMIN_TOKEN 時兩個都不開放
+ADMIN_TOKEN = os.environ.get('SALES_ADMIN_TOKEN')
+
+def admin_param(name):
+    value = st.query_params.get(name)
+    return bool(ADMIN_TOKEN) and value is not None and hmac.compare_digest(value.encode(), ADMIN_TOKEN.encode())
 
-    except Exception as e:
-        return None, str(e)
+if admin_param("status"):
+    st.json(service.status())
+    st.stop()
+
+if admin_param("perf"):
+    st.markdown("### 🩺 效能面板")
+    if not perf.ENABLED: st.warning("目前沒有量測 (環境變數 SALES_PERF=0)。")
+    cache = service.queries.stats()
+    p1, p2, p3 = st.columns(3)
+    p1.metric("🎯 查詢快取命中率", f"{cache['hits'] / max(1, cache['hits'] + cache['misses']):.0%}")
+    p2.metric("🗃️ 快取結果數", f"{cache['entries']}")
+    p3.metric("💾 快取用量", f"{cache['mb']} MB")
+    st.dataframe(pd.DataFrame(perf.summary()), use_container_width=True, hide_index=True)
+    st.caption("view: 整個分析畫面、query: 快取沒命中時的彙總運算、chart: 圖表序列化送出、load / index / refresh: 背景載入各階段")
+    st.download_button("⬇️ 匯出量測紀錄 (JSON Lines)", perf.export_log(), file_name="sales_perf.jsonl")
+    with st.expander("🔄 快照狀態"):
+        st.json(service.status())
+    if st.button("🧹 清除量測紀錄"):
+        perf.reset()
+        st.rerun()
+    st.stop()
 
 # --- 啟動解析 ---
-result = load_data_final()
-if isinstance(result, tuple) and result[0] is None: 
-    st.error(f"⚠️ 系統錯誤: {result[1]}")
+data = service.current
+if data is None:
+    with st.spinner("🚀 正在全機掃描並載入數據，請稍候..."):
+        try:
+            data = service.wait()
+        except TimeoutError as e:
+            st.error(f"⚠️ {e}")
+            st.stop()
+if data is None:
+    st.error(f"⚠️ 系統錯誤: {service.error}")
     st.stop()
 else:
-    df = result[0]
-    cust_info_map = result[1] if len(result) > 1 else {}
+    df, cust_info_map, cube, groups, search, book, orders = data[:7]
+
+# 彙總結果跨連線共用，key 帶資料版本 (換上新資料後舊結果不會再被拿到)；拿到的表是共用的，不能直接改
+def memo(name, *params, compute):
+    return service.queries.get((data.loaded_at, name) + params, lambda: perf.timed(f"query:{name}", compute))
+
+# --- 📄 分頁表格：整張表先排好 (通常已在快取裡)，每次只把目前這一頁送到手機 ---
+PAGE_SIZE = 100
+
+def paged_table(table, key, style=None, page_size=PAGE_SIZE, **kwargs):
+    # 用滑桿換頁 (不會跳出鍵盤)；筆數一變 key 就變，自動回到第 1 頁。style 只套在這一頁
+    pages = max(1, -(-len(table) // page_size))
+    page = 1
+    if pages > 1:
+        page = st.slider(f"📄 頁數 (每頁 {page_size} 筆，共 {len(table):,} 筆)", 1, pages, 1, key=f"page_{key}_{len(table)}")
+    view = table.iloc[(page - 1) * page_size:page * page_size]
+    st.dataframe(view.style.apply(style, axis=None) if style else view, **kwargs)
 
 # ==========================================
 # 📱 UI 重構區 
@@ -216,7 +134,8 @@ else:
 if df is not None:
     
     st.markdown("<h2 style='text-align: center; color: #2C3E50; margin-bottom: 0px;'>📱 行動查價站</h2>", unsafe_allow_html=True)
-    st.caption(f"<div style='text-align: center; margin-bottom: 15px;'>📊 系統資料庫筆數: {len(df):,}</div>", unsafe_allow_html=True)
+    refresh_note = "，背景更新中..." if service.refreshing else ""
+    st.caption(f"<div style='text-align: center; margin-bottom: 15px;'>📊 系統資料庫筆數: {len(df):,}　🕒 資料快照：{format_age(time.time() - data.built_at)}{refresh_note}</div>", unsafe_allow_html=True)
     
     menu_options = [
         "🏆 營運總覽 Dashboard", 
@@ -238,37 +157,10 @@ if df is not None:
         
         # 🌟 修改 2：快速跳轉改用果凍按鈕，防止鍵盤彈出
         st.markdown('<div class="cust-radio-group">', unsafe_allow_html=True)
-        date_preset = st.radio("⏳ 快速跳轉", [
-            "最近 7 天", "最近 30 天", "本月", "上個月", 
-            "最近 3 個月", "最近 6 個月", "最近 9 個月", 
-            "今年以來 (YTD)", "去年全年度", "近 3 年", "全部 5 年"
-        ], index=5, horizontal=True, label_visibility="collapsed")
+        date_preset = st.radio("⏳ 快速跳轉", DATE_PRESETS, index=5, horizontal=True, label_visibility="collapsed")
         st.markdown('</div>', unsafe_allow_html=True)
         
-        if date_preset == "最近 7 天": 
-            start_d, end_d = max_date - pd.Timedelta(days=7), max_date
-        elif date_preset == "最近 30 天": 
-            start_d, end_d = max_date - pd.Timedelta(days=30), max_date
-        elif date_preset == "本月": 
-            start_d, end_d = max_date.replace(day=1), max_date
-        elif date_preset == "上個月": 
-            first_day_this_month = max_date.replace(day=1)
-            end_d = first_day_this_month - pd.Timedelta(days=1)
-            start_d = end_d.replace(day=1)
-        elif date_preset == "最近 3 個月": 
-            start_d, end_d = (pd.to_datetime(max_date) - pd.DateOffset(months=3)).date(), max_date
-        elif date_preset == "最近 6 個月": 
-            start_d, end_d = (pd.to_datetime(max_date) - pd.DateOffset(months=6)).date(), max_date
-        elif date_preset == "最近 9 個月": 
-            start_d, end_d = (pd.to_datetime(max_date) - pd.DateOffset(months=9)).date(), max_date
-        elif date_preset == "今年以來 (YTD)": 
-            start_d, end_d = pd.Timestamp(f"{max_date.year}-01-01").date(), max_date
-        elif date_preset == "去年全年度": 
-            start_d, end_d = pd.Timestamp(f"{max_date.year-1}-01-01").date(), pd.Timestamp(f"{max_date.year-1}-12-31").date()
-        elif date_preset == "近 3 年": 
-            start_d, end_d = (pd.to_datetime(max_date) - pd.DateOffset(years=3)).date(), max_date
-        else: 
-            start_d, end_d = min_date, max_date
+        start_d, end_d = preset_range(date_preset, min_date, max_date)
         
         col_date1, col_date2 = st.columns(2)
         with col_date1:
@@ -279,8 +171,8 @@ if df is not None:
         if selected_start > selected_end: 
             st.error("⚠️ 起算日不能晚於結尾日喔！")
 
-    time_mask = (df['OUTDATE'].dt.date >= selected_start) & (df['OUTDATE'].dt.date <= selected_end)
-    v_df = df[time_mask]
+    view_started = time.perf_counter()
+    v_df = date_slice(df, selected_start, selected_end)
 
     st.markdown("---")
     st.markdown(f"### {analysis_mode}")
@@ -293,33 +185,23 @@ if df is not None:
     if "營運總覽" in analysis_mode:
         st.markdown("#### 📊 關鍵指標")
         c1, c2 = st.columns(2)
-        c1.metric("💰 區間總營收", f"${v_df['金額'].sum():,.0f}")
-        c2.metric("📦 總出貨包數", f"{v_df['數量'].sum():,.0f}")
+        total_amt, total_qty, store_count, order_count = cube.kpis(selected_start, selected_end)
+        c1.metric("💰 區間總營收", f"${total_amt:,.0f}")
+        c2.metric("📦 總出貨包數", f"{total_qty:,.0f}")
         c3, c4 = st.columns(2)
-        c3.metric("🏪 成交店數", f"{v_df['店家名稱'].nunique()}")
-        c4.metric("🧾 成交單數", f"{v_df['SOURNO'].nunique()}")
+        c3.metric("🏪 成交店數", f"{store_count}")
+        c4.metric("🧾 成交單數", f"{order_count}")
 
         st.markdown("---")
-        st.markdown("#### 📈 每日營收趨勢")
-        if not v_df.empty:
-            trend = v_df.groupby('OUTDATE')['金額'].sum().reset_index()
-            fig = px.line(trend, x='OUTDATE', y='金額', markers=True)
-            
-            # 🌟 圖表防護鎖 (防誤觸變形)
-            fig.update_layout(
-                xaxis_title="日期",
-                yaxis_title="營收金額",
-                plot_bgcolor="rgba(240, 248, 255, 0.4)", 
-                paper_bgcolor="rgba(0,0,0,0)",
-                margin=dict(l=10, r=10, t=30, b=10),
-                dragmode=False # 禁用圖表拖曳平移
-            )
-            fig.update_xaxes(fixedrange=True) # 禁用 X 軸縮放
-            fig.update_yaxes(fixedrange=True) # 禁用 Y 軸縮放
-            fig.update_traces(line_color='#1ABC9C', line_width=3, marker=dict(size=6, color='#0E6655'))
+        # 區間長就改成每週/每月加總，點數有上限；畫好的圖跟著區間一起快取
+        freq, bucket_label = trend_bucket(selected_start, selected_end)
+        st.markdown(f"#### 📈 {bucket_label}營收趨勢")
+        if cube.has_rows(selected_start, selected_end):
+            fig = memo('趨勢圖', selected_start, selected_end, compute=lambda: trend_figure(cube.trend(selected_start, selected_end, freq)))
             
             # 隱藏工具列 config={'displayModeBar': False}
-            st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
+            with perf.span("chart:趨勢圖"):
+                st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
         else:
             st.info("該區間內無交易紀錄可繪製圖表。")
 
@@ -329,16 +211,19 @@ if df is not None:
     elif "店家查帳" in analysis_mode:
         kw = st.text_input("🔍 搜尋店家名稱 (可輸入關鍵字)", "")
             
-        if kw: 
-            filter_df = v_df[v_df['店家名稱'].str.contains(kw, na=False)]
-        else:
-            filter_df = v_df
+        def store_ranking():
+            if kw: 
+                filter_df = groups.select(df, {'店家名稱': search['店家名稱'].match(kw)}, selected_start, selected_end)
+            else:
+                filter_df = v_df
+            cust_group = filter_df.groupby('店家名稱', observed=True)['金額'].sum().sort_values(ascending=False).reset_index()
+            if not cust_group.empty:
+                cust_group['Label'] = cust_group.apply(lambda x: f"{x['店家名稱']} (${x['金額']:,.0f})", axis=1)
+            return cust_group
             
-        cust_group = filter_df.groupby('店家名稱')['金額'].sum().sort_values(ascending=False).reset_index()
+        cust_group = memo('店家查帳', kw, selected_start, selected_end, compute=store_ranking)
         
         if not cust_group.empty:
-            cust_group['Label'] = cust_group.apply(lambda x: f"{x['店家名稱']} (${x['金額']:,.0f})", axis=1)
-            
             with st.expander(f"🎯 請選擇要查帳的店家 (共 {len(cust_group)} 家)", expanded=True):
                 st.markdown('<div class="cust-radio-group">', unsafe_allow_html=True)
                 sel_label = st.radio("請選擇：", cust_group['Label'].tolist(), label_visibility="collapsed")
@@ -365,7 +250,7 @@ if df is not None:
             </div>
             """, unsafe_allow_html=True)
             
-            sub = df[df['店家名稱'] == sel] 
+            sub = groups.select(df, {'店家名稱': sel})
             
             # 🌟 新增了第四個 Tab：查底價搭贈
             tab_history, tab_1yr_summary, tab_series_filter, tab_item_search = st.tabs([
@@ -376,9 +261,9 @@ if df is not None:
             ])
             
             with tab_history:
-                sub_time_filtered = filter_df[filter_df['店家名稱'] == sel]
-                og = sub_time_filtered.groupby(['日期_CN', 'SOURNO'])['金額'].sum().reset_index().sort_values('日期_CN', ascending=False)
-                og['L'] = og.apply(lambda x: f"{x['日期_CN']} (單號:{x['SOURNO']} / 金額: ${x['金額']:,.0f})", axis=1)
+                # 進貨單表頭與明細都直接查進貨單索引；選項是單的編號，顯示文字只對這家店的單做
+                og = orders.invoices(df, sel, selected_start, selected_end)
+                labels = dict(zip(og.index.tolist(), [f"{d} (單號:{n} / 金額: ${a:,.0f})" for d, n, a in zip(date_cn(og['OUTDATE']), og['SOURNO'], og['金額'])]))
                 
                 if og.empty:
                     st.info("該區間內無單筆紀錄。")
@@ -386,37 +271,18 @@ if df is not None:
                     # 🌟 修改 3：進貨單明細改為 Expander 搭配果凍按鈕，完美解決平板鍵盤彈出問題！
                     with st.expander("📝 點擊展開：選擇歷史進貨單", expanded=True):
                         st.markdown('<div class="cust-radio-group">', unsafe_allow_html=True)
-                        d_sel = st.radio("選擇進貨單查看明細", og['L'].tolist(), label_visibility="collapsed")
+                        d_sel = st.radio("選擇進貨單查看明細", list(labels), format_func=labels.get, label_visibility="collapsed")
                         st.markdown('</div>', unsafe_allow_html=True)
                         
-                    if d_sel:
-                        target_date = d_sel.split(' (')[0]
-                        target_sourno = d_sel.split('單號:')[1].split(' /')[0].strip() 
-                        detail_df = sub_time_filtered[(sub_time_filtered['日期_CN'] == target_date) & (sub_time_filtered['SOURNO'].astype(str).str.strip() == target_sourno)][['產品全名', '數量', '金額']]
+                    if d_sel is not None:
+                        detail_df = orders.items(df, d_sel)[['產品全名', '數量', '金額']]
                         st.dataframe(detail_df, use_container_width=True, hide_index=True)
                         
             with tab_1yr_summary:
-                one_year_ago = df['OUTDATE'].max() - pd.DateOffset(years=1)
-                sub_1yr = sub[sub['OUTDATE'] >= one_year_ago]
-                
-                if sub_1yr.empty:
+                if not book.has_rows(store=sel):
                     st.info("該店家近一年內無進貨紀錄。")
                 else:
-                    latest_records = sub_1yr.sort_values('OUTDATE', ascending=False).drop_duplicates('產品全名')
-                    latest_records['最新單價'] = (latest_records['金額'] / latest_records['數量']).fillna(0).round(0)
-                    latest_price_map = latest_records.set_index('產品全名')['最新單價'].to_dict()
-                    
-                    def smart_price_single(row):
-                        qty = row['數量']
-                        amt = row['金額']
-                        if qty <= 0: return 0
-                        avg = amt / qty
-                        if abs(avg - round(avg)) > 0.01:
-                            return int(latest_price_map.get(row['產品全名'], 0))
-                        return int(round(avg))
-
-                    s_agg = sub_1yr.groupby('產品全名')[['數量', '金額']].sum().reset_index().sort_values('金額', ascending=False)
-                    s_agg['參考單價'] = s_agg.apply(smart_price_single, axis=1)
+                    s_agg = book.store_summary(sel).sort_values('金額', ascending=False)
                     
                     s_agg = s_agg[['產品全名', '數量', '參考單價', '金額']]
                     s_agg['金額'] = s_agg['金額'].round(0)
@@ -430,12 +296,12 @@ if df is not None:
                     
                 if search_prefix:
                     # 支援模糊搜尋產品全名，不怕代碼漏抓
-                    series_df = sub[sub['產品全名'].str.contains(search_prefix, case=False, na=False)]
+                    series_df = sub[sub['產品全名'].isin(search['產品全名'].match(search_prefix, case=False))]
                     
                     if series_df.empty:
                         st.warning(f"這家店還沒有進過包含「{search_prefix}」的產品喔！")
                     else:
-                        series_summary = series_df.groupby('產品全名').agg(
+                        series_summary = series_df.groupby('產品全名', observed=True).agg(
                             總購買量=('數量', 'sum'),
                             總貢獻額=('金額', 'sum'),
                             最後叫貨日=('OUTDATE', 'max')
@@ -461,7 +327,7 @@ if df is not None:
                 search_item_kw = st.text_input("📦 輸入產品關鍵字：", placeholder="例如：DD315 或 雞肉", key="item_search_kw_mobile")
                 
                 if search_item_kw:
-                    target_df = sub[sub['產品全名'].str.contains(search_item_kw, case=False, na=False)].copy()
+                    target_df = sub[sub['產品全名'].isin(search['產品全名'].match(search_item_kw, case=False))].copy()
                     
                     if target_df.empty:
                         st.warning(f"查無 {clean_sel} 關於「{search_item_kw}」的任何進貨紀錄。")
@@ -481,16 +347,16 @@ if df is not None:
                         m2.metric("🔺 最高價", f"${max_p:,.1f}")
                         m3.metric("🔻 最低價", f"${min_p:,.1f}")
                         
+                        target_df['日期_CN'] = date_cn(target_df['OUTDATE'])
                         show_cols = ['日期_CN', '產品全名', '數量', '真實單價', '金額', '交易性質']
                         display_df = target_df[show_cols].rename(columns={'日期_CN': '日期'})
                         
-                        # 🔥 視覺特效：如果是搭贈，背景變成淺紅色高亮
-                        def highlight_zero(row):
-                            if row['真實單價'] == 0:
-                                return ['background-color: #FFE6E6; color: #D35400; font-weight: bold'] * len(row)
-                            return [''] * len(row)
+                        # 🔥 視覺特效：如果是搭贈，背景變成淺紅色高亮 (整頁一次算好樣式，不逐列呼叫)
+                        def highlight_zero(view):
+                            css = np.where(view['真實單價'].to_numpy() == 0, 'background-color: #FFE6E6; color: #D35400; font-weight: bold', '')
+                            return pd.DataFrame(np.repeat(css[:, None], view.shape[1], axis=1), index=view.index, columns=view.columns)
                         
-                        st.dataframe(display_df.style.apply(highlight_zero, axis=1), use_container_width=True, hide_index=True)
+                        paged_table(display_df, f"item_{sel}_{search_item_kw}", style=highlight_zero, use_container_width=True, hide_index=True)
 
     # ==========================================
     # 2. 全店家一年進貨總表
@@ -498,56 +364,36 @@ if df is not None:
     elif "全店家總表" in analysis_mode:
         st.info("💡 選擇特定業務與店家，系統自動還原近一年的最新拿貨底價。")
         
-        one_year_ago = df['OUTDATE'].max() - pd.DateOffset(years=1)
-        df_1yr = df[df['OUTDATE'] >= one_year_ago]
-        
-        if df_1yr.empty:
+        if not book.has_rows():
             st.warning("⚠️ 區間內無資料。")
         else:
             col_f1, col_f2 = st.columns(2)
             
             with col_f1:
-                sales_list = ["--- 全部業務 ---"] + sorted(df_1yr['業務員'].astype(str).unique().tolist())
+                sales_list = ["--- 全部業務 ---"] + book.reps()
                 # 這裡保留下拉選單，因為名單可能很長
                 selected_sales_filter = st.selectbox("👤 1. 請選擇業務：", sales_list)
             
-            df_1yr_filtered = df_1yr[df_1yr['業務員'] == selected_sales_filter] if selected_sales_filter != "--- 全部業務 ---" else df_1yr
+            sel_rep = selected_sales_filter if selected_sales_filter != "--- 全部業務 ---" else None
 
             with col_f2:
-                cust_list = ["--- 全部店家 ---"] + sorted(df_1yr_filtered['店家名稱'].astype(str).unique().tolist())
+                cust_list = ["--- 全部店家 ---"] + book.stores(sel_rep)
                 # 這裡保留下拉選單，因為名單可能很長
                 selected_cust_filter = st.selectbox("🏪 2. 請選擇店家：", cust_list)
             
-            df_1yr_filtered = df_1yr_filtered[df_1yr_filtered['店家名稱'] == selected_cust_filter] if selected_cust_filter != "--- 全部店家 ---" else df_1yr_filtered
+            sel_store = selected_cust_filter if selected_cust_filter != "--- 全部店家 ---" else None
 
-            if df_1yr_filtered.empty:
+            if not book.has_rows(sel_rep, sel_store):
                 st.warning("⚠️ 該條件下近一年無紀錄。")
             else:
-                latest_records = df_1yr_filtered.sort_values('OUTDATE', ascending=False).drop_duplicates(['店家名稱', '產品全名'])
-                latest_records['最新單價'] = (latest_records['金額'] / latest_records['數量']).fillna(0).round(0)
-                latest_price_map = latest_records.set_index(['店家名稱', '產品全名'])['最新單價'].to_dict()
-                
-                def smart_price_multi(row):
-                    qty = row['數量']
-                    amt = row['金額']
-                    if qty <= 0: return 0
-                    avg = amt / qty
-                    if abs(avg - round(avg)) > 0.01:
-                        return int(latest_price_map.get((row['店家名稱'], row['產品全名']), 0))
-                    return int(round(avg))
-
-                agg_df = df_1yr_filtered.groupby(['業務員', '店家名稱', '產品全名'])[['數量', '金額']].sum().reset_index()
-                agg_df['參考單價'] = agg_df.apply(smart_price_multi, axis=1)
+                def price_table():
+                    agg_df = book.table(sel_rep, sel_store).sort_values(['店家名稱', '金額'], ascending=[True, False])
+                    agg_df = agg_df[['業務員', '店家名稱', '產品全名', '數量', '參考單價', '金額']]
+                    agg_df['金額'] = agg_df['金額'].round(0)
+                    return agg_df
+                agg_df = memo('全店家總表', sel_rep, sel_store, compute=price_table)
                 
-                agg_df = agg_df.sort_values(['店家名稱', '金額'], ascending=[True, False])
-                agg_df = agg_df[['業務員', '店家名稱', '產品全名', '數量', '參考單價', '金額']]
-                agg_df['金額'] = agg_df['金額'].round(0)
-                
-                if len(agg_df) > 800:
-                    st.warning(f"⚠️ 報表過於龐大 (共 {len(agg_df)} 筆)！為防止手機當機，目前僅顯示前 800 筆。請在上方選擇【業務】或【店家】來縮小範圍！")
-                    st.dataframe(agg_df.head(800), use_container_width=True, hide_index=True, height=600)
-                else:
-                    st.dataframe(agg_df, use_container_width=True, hide_index=True, height=600)
+                paged_table(agg_df, f"book_{sel_rep}_{sel_store}", use_container_width=True, hide_index=True, height=600)
 
     # ==========================================
     # 3. 系列分析
@@ -559,49 +405,56 @@ if df is not None:
         with c2: s = st.number_input("2. 起始號", 1, value=1)
         with c3: e = st.number_input("3. 結束號", 1, value=99)
         if pre:
-            mask = (v_df['Prefix'] == pre) & (v_df['ProdNum'] >= s) & (v_df['ProdNum'] <= e)
-            sub = v_df[mask]
-            if sub.empty: st.warning("❌ 查無資料")
+            def series_rows():
+                return v_df[(v_df['Prefix'] == pre) & (v_df['ProdNum'] >= s) & (v_df['ProdNum'] <= e)]
+            def series_ranking():
+                sub = series_rows()
+                return len(sub), sub.groupby('產品全名', observed=True)['金額'].sum().reset_index().sort_values('金額', ascending=False)
+            series_key = (pre, s, e, selected_start, selected_end)
+            sub_count, pr_amt = memo('系列分析', *series_key, compute=series_ranking)
+            if sub_count == 0: st.warning("❌ 查無資料")
             else:
-                st.success(f"✅ 找到 {len(sub)} 筆交易")
-                pr_amt = sub.groupby('產品全名')['金額'].sum().reset_index().sort_values('金額', ascending=False)
+                st.success(f"✅ 找到 {sub_count} 筆交易")
                 
                 st.markdown("#### 💰 銷售排行榜")
-                fig = px.bar(pr_amt, x='金額', y='產品全名', orientation='h', text_auto='.2s', color='金額', color_continuous_scale='Blues')
-                
-                # 🌟 圖表防護鎖 (防誤觸變形)
-                fig.update_layout(
-                    yaxis=dict(autorange="reversed"),
-                    dragmode=False, # 禁用拖曳
-                    margin=dict(l=10, r=10, t=30, b=10)
-                )
-                fig.update_xaxes(fixedrange=True) # 禁用 X 軸縮放
-                fig.update_yaxes(fixedrange=True) # 禁用 Y 軸縮放
+                # 只畫前 20 名，其餘併成「其他」
+                fig = memo('系列排行圖', *series_key, compute=lambda: ranking_figure(pr_amt))
                 
                 # 隱藏工具列 config={'displayModeBar': False}
-                st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
+                with perf.span("chart:系列排行圖"):
+                    st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
 
                 st.markdown("---")
                 selected_prod = st.selectbox("🎯 看單一產品賣給誰：", ["--- 請選擇 ---"] + pr_amt['產品全名'].tolist())
                 if selected_prod != "--- 請選擇 ---":
-                    prod_df = sub[sub['產品全名'] == selected_prod]
-                    buyer_rank = prod_df.groupby('店家名稱')[['數量', '金額']].sum().reset_index().sort_values('數量', ascending=False)
+                    def buyer_ranking():
+                        sub = series_rows()
+                        prod_df = sub[sub['產品全名'] == selected_prod]
+                        return prod_df.groupby('店家名稱', observed=True)[['數量', '金額']].sum().reset_index().sort_values('數量', ascending=False)
+                    buyer_rank = memo('系列分析-買家', *series_key, selected_prod, compute=buyer_ranking)
                     st.dataframe(buyer_rank, use_container_width=True, hide_index=True)
 
     # ==========================================
     # 4. 業務績效深鑽
     # ==========================================
     elif "業務績效" in analysis_mode:
-        sales_list = sorted(v_df['業務員'].astype(str).unique())
+        sales_list = memo('業務名單', selected_start, selected_end, compute=lambda: sorted(pd.Series(v_df['業務員'].unique()).astype(str).unique()))
         selected_sales = st.selectbox("👤 選擇業務員", ["--- 請選擇 ---"] + sales_list)
         
         if selected_sales != "--- 請選擇 ---":
-            s_df = v_df[v_df['業務員'] == selected_sales]
+            def rep_ranking():
+                s_df = groups.select(df, {'業務員': selected_sales}, selected_start, selected_end)
+                cust_rank_df = s_df.groupby('店家名稱', observed=True)['金額'].sum().reset_index().sort_values('金額', ascending=False)
+                # 數字格式化與欄位改名，讓手機看更直覺
+                cust_rank_df['金額'] = cust_rank_df['金額'].round(0)
+                cust_rank_df = cust_rank_df.rename(columns={'店家名稱': '店家', '金額': '貢獻業績($)'})
+                return s_df['金額'].sum(), s_df['店家名稱'].nunique(), cust_rank_df
+
+            total_sales, unique_cust_count, cust_rank_df = memo('業務績效', selected_sales, selected_start, selected_end, compute=rep_ranking)
             k1, k2 = st.columns(2)
-            k1.metric("💰 總結業績", f"${s_df['金額'].sum():,.0f}")
+            k1.metric("💰 總結業績", f"${total_sales:,.0f}")
             
-            # 計算成交家數並存成變數
-            unique_cust_count = s_df['店家名稱'].nunique()
+            # 成交家數
             k2.metric("🏪 成交家數", f"{unique_cust_count}")
             
             st.markdown("---")
@@ -609,11 +462,6 @@ if df is not None:
             # 🌟 新增：客戶貢獻排行榜 (直接列出那 N 家店並依金額排序)
             if unique_cust_count > 0:
                 st.markdown(f"#### 🏆 {selected_sales} 的客戶貢獻排行榜")
-                cust_rank_df = s_df.groupby('店家名稱')['金額'].sum().reset_index().sort_values('金額', ascending=False)
-                
-                # 數字格式化與欄位改名，讓手機看更直覺
-                cust_rank_df['金額'] = cust_rank_df['金額'].round(0)
-                cust_rank_df = cust_rank_df.rename(columns={'店家名稱': '店家', '金額': '貢獻業績($)'})
                 
                 # 顯示表格
                 st.dataframe(cust_rank_df, use_container_width=True, hide_index=True)
@@ -625,15 +473,18 @@ if df is not None:
                 selected_s_cust = st.selectbox("🔍 深度查帳 (看他賣了什麼給單一店家)：", ["--- 請選擇 ---"] + cust_opts)
                 
                 if selected_s_cust != "--- 請選擇 ---":
-                    detail_df = s_df[s_df['店家名稱'] == selected_s_cust]
+                    detail_df = groups.select(df, {'業務員': selected_sales, '店家名稱': selected_s_cust}, selected_start, selected_end)
                     
                     t_prod, t_detail = st.tabs(["📦 賣出產品總計", "🧾 單筆歷史紀錄"])
                     with t_prod:
-                        prod_summary = detail_df.groupby('產品全名')[['數量', '金額']].sum().reset_index().sort_values('金額', ascending=False)
+                        prod_summary = detail_df.groupby('產品全名', observed=True)[['數量', '金額']].sum().reset_index().sort_values('金額', ascending=False)
                         st.dataframe(prod_summary, use_container_width=True, hide_index=True)
                     with t_detail:
                         show_cols = ['日期_CN', 'SOURNO', '產品全名', '數量', '金額']
-                        st.dataframe(detail_df[show_cols].sort_values('日期_CN', ascending=False), use_container_width=True, hide_index=True)
+                        # 排序只做一次 (快取起來)，換頁只切片
+                        history = memo('業務明細', selected_sales, selected_s_cust, selected_start, selected_end,
+                                       compute=lambda: detail_df.assign(日期_CN=date_cn(detail_df['OUTDATE']))[show_cols].sort_values('日期_CN', ascending=False))
+                        paged_table(history, f"history_{selected_sales}_{selected_s_cust}", use_container_width=True, hide_index=True)
             else:
                 st.warning("該區間內無成交紀錄。")
 
@@ -648,13 +499,15 @@ if df is not None:
         if chain_kw:
             # --- 1. 暴力模糊比對：抓出所有包含關鍵字的原始資料 ---
             # 這裡不受上方時間選擇器影響，才能抓到最完整的店名清單
-            raw_match_df = v_df[v_df['店家名稱'].str.contains(chain_kw, case=False, na=False)]
+            def chain_rows():
+                return groups.select(df, {'店家名稱': search['店家名稱'].match(chain_kw, case=False)}, selected_start, selected_end)
+
+            # 提取不重複的店家名單
+            potential_stores = memo('體系連鎖-分店', chain_kw, selected_start, selected_end, compute=lambda: chain_rows()['店家名稱'].unique().tolist())
 
-            if raw_match_df.empty:
+            if not potential_stores:
                 st.warning(f"⚠️ 在此時間區間內，查無包含「{chain_kw}」的店家。")
             else:
-                # 提取不重複的店家名單
-                potential_stores = raw_match_df['店家名稱'].unique().tolist()
 
                 st.markdown("---")
                 st.markdown("##### 🎯 步驟二：確認分店名單")
@@ -669,16 +522,23 @@ if df is not None:
                 if not selected_stores:
                     st.warning("⚠️ 請至少保留一家分店來進行分析！")
                 else:
-                    # --- 3. 根據最終名單，篩選出真正的體系數據 ---
-                    final_chain_df = raw_match_df[raw_match_df['店家名稱'].isin(selected_stores)]
+                    # --- 3. 根據最終名單，篩選出真正的體系數據，彙總成 KPI 與分店/品項排行 ---
+                    def chain_summary():
+                        raw_match_df = chain_rows()
+                        final_chain_df = raw_match_df[raw_match_df['店家名稱'].isin(selected_stores)]
+                        branch_sales = final_chain_df.groupby('店家名稱', observed=True)[['金額', '數量']].sum().reset_index().sort_values('金額', ascending=False)
+                        prod_rank_base = final_chain_df.groupby('產品全名', observed=True)[['數量', '金額']].sum().reset_index()
+                        return final_chain_df['金額'].sum(), final_chain_df['數量'].sum(), branch_sales, prod_rank_base
+
+                    chain_amt, chain_qty, branch_sales, prod_rank_base = memo('體系連鎖', chain_kw, selected_start, selected_end, tuple(selected_stores), compute=chain_summary)
                     final_branch_count = len(selected_stores)
 
                     st.success(f"✅ 已鎖定 **{final_branch_count}** 家分店進行業績彙整。")
 
                     # --- 體系整體 KPI ---
                     c1, c2, c3 = st.columns(3)
-                    c1.metric("💰 體系總營收", f"${final_chain_df['金額'].sum():,.0f}")
-                    c2.metric("📦 總叫貨包數", f"{final_chain_df['數量'].sum():,.0f}")
+                    c1.metric("💰 體系總營收", f"${chain_amt:,.0f}")
+                    c2.metric("📦 總叫貨包數", f"{chain_qty:,.0f}")
                     c3.metric("🏪 活躍分店", f"{final_branch_count} 家")
 
                     st.markdown("---")
@@ -688,8 +548,6 @@ if df is not None:
                     tab_store, tab_prod_qty, tab_prod_amt = st.tabs(["🏪 分店排行", "📦 品項(數量)", "💰 品項(業績)"])
 
                     with tab_store:
-                        branch_sales = final_chain_df.groupby('店家名稱')[['金額', '數量']].sum().reset_index().sort_values('金額', ascending=False)
-                        
                         # 手機圖表防呆設定
                         fig_branch = px.bar(
                             branch_sales.head(15), # 手機版圖表最多顯示前15家避免拉太長
@@ -702,7 +560,8 @@ if df is not None:
                         fig_branch.update_layout(yaxis=dict(autorange="reversed"), margin=dict(l=10, r=10, t=10, b=10), dragmode=False)
                         fig_branch.update_xaxes(fixedrange=True)
                         fig_branch.update_yaxes(fixedrange=True)
-                        st.plotly_chart(fig_branch, use_container_width=True, config={'displayModeBar': False})
+                        with perf.span("chart:體系分店圖"):
+                            st.plotly_chart(fig_branch, use_container_width=True, config={'displayModeBar': False})
                         
                         show_branch = branch_sales.copy()
                         show_branch['金額'] = show_branch['金額'].apply(lambda x: f"${x:,.0f}")
@@ -710,8 +569,6 @@ if df is not None:
                         st.dataframe(show_branch.rename(columns={'金額': '總業績', '數量': '總包數'}), use_container_width=True, hide_index=True)
 
                     # 品項排行處理
-                    prod_rank_base = final_chain_df.groupby('產品全名')[['數量', '金額']].sum().reset_index()
-
                     def format_df_sales(df_in):
                         df_out = df_in.copy()
                         df_out['金額'] = df_out['金額'].apply(lambda x: f"${x:,.0f}")
@@ -722,4 +579,7 @@ if df is not None:
                         st.dataframe(format_df_sales(prod_rank_base.sort_values('數量', ascending=False)), use_container_width=True, hide_index=True)
 
                     with tab_prod_amt:
-                        st.dataframe(format_df_sales(prod_rank_base.sort_values('金額', ascending=False)), use_container_width=True, hide_index=True)
\ No newline at end of file
+                        st.dataframe(format_df_sales(prod_rank_base.sort_values('金額', ascending=False)), use_container_width=True, hide_index=True)
+
+    # 整個分析畫面的耗時 (含彙總、表格與圖表送出)，處理筆數以區間內明細計
+    perf.record(f"view:{analysis_mode}", time.perf_counter() - view_started, len(v_df))
\ No newline at end of file
@@ -0,0 +1,332 @@
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import runpy
+import zipfile
+import platform
+import subprocess
+import numpy as np
+import pandas as pd
+from dbf_reader import DbfWriter, write_dbf
+from sales_data import load_sales_data, CACHE_DIR_NAME
+from sales_index import DailyCube, GroupIndex, OrderIndex, PriceBook, TextIndex, DATE_PRESETS, date_slice, preset_range
+from sales_charts import trend_bucket
+from sales_refresh import build_dataset
+
+# --- ⏱️ 效能壓測 ---
+# python bench.py generate --rows=1000000 --stores=3000 --prefixes=200 --reps=40 --out=bench_data [--zip] [--saler]
+#   產生假的 5 年銷售檔 (All_Sales_5Years.csv 或 .zip) 與對應的 CUST.DBF、LABORER.DBF；--saler 另外產生 SALER2.DBF 給匯出壓測
+# python bench.py run --data=bench_data --out=bench_results.json --repeat=3
+#   量冷啟動、熱啟動、每個快速跳轉區間、六個分析模式的核心運算，記錄秒數與記憶體峰值，寫成 JSON 方便跨 commit 比較
+# 同一組參數 (含 --seed) 產生的資料每次都一樣
+
+def arg(name, default=None):
+    return next((a.split('=', 1)[1] for a in sys.argv if a.startswith(f'--{name}=')), default)
+
+# --- 🏭 假資料產生器 ---
+SURNAMES = list("陳林黃張李王吳劉蔡楊許鄭謝郭洪邱曾廖賴徐周葉蘇莊呂江何蕭羅高")
+GIVEN = list("怡君雅婷志明俊傑佳慧淑芬家豪宗翰詩涵冠宇建宏美玲文彬")
+STORE_WORDS = list("寵物毛孩汪喵樂園生活館小舖之家森林好友天堂快樂幸福寶貝")
+STORE_KINDS = ["寵物店", "水族館", "動物醫院", "寵物美容", "生活館", "商行"]
+CITIES = ["台北", "新北", "桃園", "新竹", "台中", "彰化", "嘉義", "台南", "高雄", "屏東", "宜蘭", "花蓮"]
+PRODUCT_WORDS = ["雞肉", "牛肉", "鮭魚", "羊肉", "潔牙骨", "皮骨", "罐頭", "貓砂", "飼料", "肉乾", "餅乾", "凍乾", "項圈", "玩具"]
+SIZES = ["(小)", "(大)", "3支入", "8支", "5L", "400g", "1kg", "2.5吋", "4.5吋", ""]
+LETTERS = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+
+SALES_COLUMNS = ['SOURNO', 'OUTDATE', 'CUST_NO', 'SUBNO', 'PART_NO', 'TITLE', 'OUTQTY', 'PRICE', 'SUBTOT', 'MEMO']
+SALER_FIELDS = [('SOURNO', 'C', 10, 0), ('OUTDATE', 'C', 8, 0), ('CUST_NO', 'C', 8, 0), ('SUBNO', 'C', 4, 0), ('PART_NO', 'C', 10, 0),
+                ('TITLE', 'C', 40, 0), ('OUTQTY', 'N', 10, 2), ('PRICE', 'N', 10, 2), ('SUBTOT', 'N', 12, 2), ('MEMO', 'C', 20, 0)]
+CUST_FIELDS = [('CUST_NO', 'C', 8, 0), ('COMPANY', 'C', 28, 0), ('TELE1', 'C', 14, 0), ('TELE2', 'C', 23, 0), ('CARADD', 'C', 48, 0), ('INVOADD', 'C', 48, 0)]
+LABORER_FIELDS = [('SUBNO', 'C', 4, 0), ('NAME', 'C', 8, 0)]
+
+def popularity(rng, n, skew=0.9):
+    # 排名越前面越常出現 (近似 Zipf)，順序打亂免得編號小的剛好都是大戶
+    w = 1.0 / np.arange(1, n + 1) ** skew
+    return rng.permutation(w / w.sum())
+
+def make_reps(rng, n):
+    names = [rng.choice(SURNAMES) + rng.choice(GIVEN) + rng.choice(GIVEN) for _ in range(n)]
+    return np.array([f'{i + 1:04d}' for i in range(n)], dtype=object), np.array(names, dtype=object)
+
+def make_stores(rng, n, n_reps):
+    # 約三成的店屬於連鎖體系 (同一個品牌字首 + 城市分店)，體系連鎖分析才有東西可以抓
+    n_chains = max(5, n // 100)
+    chains = [''.join(rng.choice(STORE_WORDS, 3)) for _ in range(n_chains)]
+    names = []
+    for i in range(n):
+        if rng.random() < 0.3:
+            names.append(f"{chains[rng.integers(n_chains)]} {rng.choice(CITIES)}{rng.integers(1, 9)}店")
+        else:
+            names.append(f"{''.join(rng.choice(STORE_WORDS, 2))}{rng.choice(STORE_KINDS)}")
+    ids = np.array([f'{42000000 + i}' for i in range(n)], dtype=object)
+    tel = np.array([f'0{rng.integers(2, 9)}-{rng.integers(2000000, 9999999)}' if rng.random() < 0.85 else '' for _ in range(n)], dtype=object)
+    mobile = np.array([f'09{rng.integers(10000000, 99999999)}' if t == '' and rng.random() < 0.5 else '' for t in tel], dtype=object)
+    addr = np.array([f"{rng.choice(CITIES)}市{rng.choice(STORE_WORDS)}路{rng.integers(1, 400)}號" for _ in range(n)], dtype=object)
+    owner = rng.integers(0, n_reps, n)  # 每家店的主要負責業務
+    return ids, np.array(names, dtype=object), tel, mobile, addr, owner
+
+def make_products(rng, n_prefixes, per_prefix=40):
+    prefixes = set()
+    while len(prefixes) < n_prefixes:
+        prefixes.add(''.join(rng.choice(LETTERS, rng.integers(2, 4))))
+    parts, titles, prices = [], [], []
+    for pre in sorted(prefixes):
+        brand = ''.join(rng.choice(STORE_WORDS, 2))
+        for num in rng.choice(np.arange(1, 400), size=rng.integers(3, per_prefix * 2), replace=False):
+            # 代碼寫法混一點空白與連字號，跟實際資料一樣
+            style = rng.random()
+            parts.append(f'{pre}{num:03d}' if style < 0.9 else (f'{pre} {num}' if style < 0.95 else f'{pre}-{num}'))
+            titles.append(f"{brand}-{rng.choice(PRODUCT_WORDS)}{rng.choice(SIZES)}")
+            prices.append(round(rng.uniform(20, 500) * 2) / 2)
+    return np.array(parts, dtype=object), np.array(titles, dtype=object), np.array(prices)
+
+def generate(out, rows, n_stores, n_prefixes, n_reps, seed=0, end='2026-03-18', years=5, make_zip=False, make_saler=False):
+    rng = np.random.default_rng(seed)
+    os.makedirs(out, exist_ok=True)
+    rep_ids, rep_names = make_reps(rng, n_reps)
+    store_ids, store_names, tel, mobile, addr, owner = make_stores(rng, n_stores, n_reps)
+    parts, titles, base_price = make_products(rng, n_prefixes)
+
+    write_dbf(os.path.join(out, 'LABORER.DBF'), LABORER_FIELDS, {'SUBNO': rep_ids, 'NAME': rep_names})
+    write_dbf(os.path.join(out, 'CUST.DBF'), CUST_FIELDS, {'CUST_NO': store_ids, 'COMPANY': store_names, 'TELE1': tel,
+                                                           'TELE2': mobile, 'CARADD': addr, 'INVOADD': addr})
+
+    # 單頭：日期 (週日少、年底旺季多)、店家、業務；單身平均 4 行
+    days = pd.date_range(end=pd.Timestamp(end), periods=365 * years + 1, freq='D')
+    day_w = np.where(days.dayofweek == 6, 0.3, 1.0) * (1 + 0.3 * np.cos((days.dayofyear.to_numpy() - 335) / 365 * 2 * np.pi))
+    n_orders = max(1, rows // 4)
+    order_day = np.sort(rng.choice(len(days), n_orders, p=day_w / day_w.sum()))
+    order_store = rng.choice(n_stores, n_orders, p=popularity(rng, n_stores))
+    order_rep = np.where(rng.random(n_orders) < 0.9, owner[order_store], rng.integers(0, n_reps, n_orders))
+    line_order = np.sort(rng.integers(0, n_orders, rows))
+    day_text = days.strftime('%Y%m%d').to_numpy(dtype=object)
+
+    csv_path = os.path.join(out, 'All_Sales_5Years.csv')
+    saler = DbfWriter(os.path.join(out, 'SALER2.DBF'), SALER_FIELDS) if make_saler else None
+    product_p = popularity(rng, len(parts))
+    batch = 1_000_000
+    for a in range(0, rows, batch):
+        o = line_order[a:a + batch]
+        n = len(o)
+        prod = rng.choice(len(parts), n, p=product_p)
+        qty = rng.integers(1, 21, n).astype(float)
+        returned = rng.random(n) < 0.03  # 退貨是負數量
+        qty[returned] = -rng.integers(1, 6, returned.sum())
+        price = base_price[prod] * np.where(rng.random(n) < 0.05, 0, 1)  # 0 元搭贈
+        chunk = pd.DataFrame({
+            'SOURNO': (o + 1100000000).astype(str), 'OUTDATE': day_text[order_day[o]],
+            'CUST_NO': np.where(rng.random(n) < 0.001, '99999999', store_ids[order_store[o]]),  # 少數對不到對照表的編號
+            'SUBNO': rep_ids[order_rep[o]], 'PART_NO': parts[prod], 'TITLE': titles[prod],
+            'OUTQTY': qty, 'PRICE': price, 'SUBTOT': qty * price, 'MEMO': '',
+        }, columns=SALES_COLUMNS)
+        chunk.to_csv(csv_path, mode='w' if a == 0 else 'a', header=a == 0, index=False, encoding='utf-8-sig' if a == 0 else 'utf-8')
+        if saler is not None: saler.write({col: chunk[col].to_numpy() for col in chunk.columns})
+        print(f"  ...已產生 {min(rows, a + batch):,} / {rows:,} 筆", flush=True)
+
+    if saler is not None: saler.close()
+    if make_zip:
+        with zipfile.ZipFile(os.path.join(out, 'All_Sales_5Years.zip'), 'w', zipfile.ZIP_DEFLATED) as z:
+            z.write(csv_path, 'All_Sales_5Years.csv')
+        os.remove(csv_path)
+
+# --- 📏 計時與記憶體峰值 (Linux：寫 5 到 /proc/self/clear_refs 可以把峰值歸零) ---
+def _status_kb(key):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(key + ':'): return int(line.split()[1])
+    except OSError: pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def reset_peak():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f: f.write('5')
+    except OSError: pass
+
+def measure(stage, fn, repeat, **extra):
+    times, peaks, deltas = [], [], []
+    for _ in range(repeat):
+        gc.collect()
+        reset_peak()
+        before = _status_kb('VmRSS')
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+        peak = _status_kb('VmHWM')
+        peaks.append(peak / 1024)
+        deltas.append(max(0, peak - before) / 1024)
+    result = {'stage': stage, 'seconds': round(min(times), 4), 'median_seconds': round(float(np.median(times)), 4),
+              'peak_rss_mb': round(max(peaks), 1), 'peak_delta_mb': round(max(deltas), 1), 'repeat': repeat, **extra}
+    print(f"  {stage:<28} {result['seconds']:>9.3f}s  +{result['peak_delta_mb']:>8.1f} MB", flush=True)
+    return result
+
+def run_child(command, data, repeat):
+    # 載入與匯出各開一個新行程量，才不會被前面留下的記憶體與模組狀態影響
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), command, f'--data={data}', f'--repeat={repeat}'],
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def use_data_dir(data):
+    os.environ['SALES_DATA_DIR'] = os.path.abspath(data)
+    os.chdir(data)
+
+def child_load(data, repeat, cold):
+    use_data_dir(data)
+    def load():
+        if cold: shutil.rmtree(CACHE_DIR_NAME, ignore_errors=True)
+        df, info = load_sales_data()
+        if df is None: raise RuntimeError(info)
+    if not cold: load()  # 熱啟動要先有快照
+    with open(os.devnull, 'w') as quiet:
+        stdout, sys.stdout = sys.stdout, quiet
+        try: result = measure('load_cold' if cold else 'load_warm', load, repeat)
+        finally: sys.stdout = stdout
+    print(json.dumps(result, ensure_ascii=False))
+
+def child_export(data, repeat):
+    # clean_data.py 在獨立的資料夾 (. 開頭，找資料檔時不會進去) 跑，產出的 CSV 不會蓋掉壓測用的主檔
+    work = os.path.join(os.path.abspath(data), '.export_bench')
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clean_data.py')
+    shutil.rmtree(work, ignore_errors=True)
+    os.makedirs(work)
+    try: os.symlink(os.path.join(os.path.abspath(data), 'SALER2.DBF'), os.path.join(work, 'SALER2.DBF'))
+    except OSError: shutil.copyfile(os.path.join(data, 'SALER2.DBF'), os.path.join(work, 'SALER2.DBF'))
+    os.chdir(work)
+    sys.argv = [script]
+    with open(os.devnull, 'w') as quiet:
+        stdout, sys.stdout = sys.stdout, quiet
+        try: result = measure('export_csv', lambda: runpy.run_path(script, run_name='__main__'), repeat)
+        finally: sys.stdout = stdout
+    print(json.dumps(result, ensure_ascii=False))
+
+# --- 🧪 各畫面的核心運算 (跟 app.py 裡對應區塊做一樣的事，不含畫面輸出) ---
+def sample_keys(df, v_df):
+    # 每次都挑同樣的查詢對象：區間內最大的店、業務、系列字首，以及最多分店共用的三字店名字首 (體系名稱)
+    stores = v_df['店家名稱'].value_counts()
+    names = pd.Series(pd.unique(df['店家名稱'].dropna()).astype(str))  # 店家多時 店家名稱 會維持 object，不一定是 category
+    return {
+        'store': stores.index[0], 'store_kw': str(stores.index[0])[:2],
+        'rep': v_df['業務員'].value_counts().index[0],
+        'prefix': v_df['Prefix'].value_counts().index[0],
+        'chain_kw': names.str[:3].value_counts().index[0],
+    }
+
+def mode_tasks(data, start, end):
+    df, _, cube, groups, search, book, orders = data[:7]
+    v_df = date_slice(df, start, end)
+    keys = sample_keys(df, v_df)
+    freq, _ = trend_bucket(start, end)
+
+    def dashboard():
+        cube.kpis(start, end)
+        cube.trend(start, end, freq)
+
+    def store_audit():
+        rows = groups.select(df, {'店家名稱': search['店家名稱'].match(keys['store_kw'])}, start, end)
+        rows.groupby('店家名稱', observed=True)['金額'].sum().sort_values(ascending=False)
+        og = orders.invoices(df, keys['store'], start, end)
+        if len(og): orders.items(df, og.index[0])
+        book.store_summary(keys['store'])
+
+    def price_book():
+        book.table(None, None).sort_values(['店家名稱', '金額'], ascending=[True, False])
+        book.table(keys['rep'], None)
+
+    def series():
+        sub = v_df[(v_df['Prefix'] == keys['prefix']) & (v_df['ProdNum'] >= 1) & (v_df['ProdNum'] <= 99)]
+        sub.groupby('產品全名', observed=True)['金額'].sum().sort_values(ascending=False)
+
+    def rep_performance():
+        sorted(v_df['業務員'].astype(str).unique())
+        s_df = groups.select(df, {'業務員': keys['rep']}, start, end)
+        s_df.groupby('店家名稱', observed=True)['金額'].sum().sort_values(ascending=False)
+
+    def chain():
+        raw = groups.select(df, {'店家名稱': search['店家名稱'].match(keys['chain_kw'], case=False)}, start, end)
+        final = raw[raw['店家名稱'].isin(raw['店家名稱'].unique().tolist())]
+        final.groupby('店家名稱', observed=True)[['金額', '數量']].sum().sort_values('金額', ascending=False)
+        final.groupby('產品全名', observed=True)[['數量', '金額']].sum()
+
+    return keys, [('mode:營運總覽', dashboard), ('mode:店家查帳', store_audit), ('mode:全店家總表', price_book),
+                  ('mode:系列產品分析', series), ('mode:業務績效深鑽', rep_performance), ('mode:體系連鎖店分析', chain)]
+
+def git_commit():
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        sha = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=here, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=here, capture_output=True, text=True).stdout.strip())
+        return sha + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError): return None
+
+def run(data, out, repeat):
+    data = os.path.abspath(data)
+    out = os.path.abspath(out)
+    print("⏱️ 載入")
+    results = [run_child('load-cold', data, 1), run_child('load-warm', data, repeat)]
+    for r in results: print(f"  {r['stage']:<28} {r['seconds']:>9.3f}s  +{r['peak_delta_mb']:>8.1f} MB")
+    if os.path.exists(os.path.join(data, 'SALER2.DBF')):
+        results.append(run_child('export', data, 1))
+        print(f"  {'export_csv':<28} {results[-1]['seconds']:>9.3f}s  +{results[-1]['peak_delta_mb']:>8.1f} MB")
+
+    use_data_dir(data)
+    df, info = load_sales_data()
+    if df is None: raise RuntimeError(info)
+
+    print("⏱️ 索引")
+    results.append(measure('index:DailyCube', lambda: DailyCube(df), repeat))
+    results.append(measure('index:GroupIndex', lambda: GroupIndex(df), repeat))
+    results.append(measure('index:TextIndex', lambda: [TextIndex(df[c]) for c in ('店家名稱', '產品全名')], repeat))
+    results.append(measure('index:PriceBook', lambda: PriceBook(df), repeat))
+    results.append(measure('index:OrderIndex', lambda: OrderIndex(df), repeat))
+    dataset = build_dataset(df, info, None, time.time())
+
+    print("⏱️ 快速跳轉區間 (切片 + KPI + 趨勢)")
+    min_date, max_date = df['OUTDATE'].min().date(), df['OUTDATE'].max().date()
+    for preset in DATE_PRESETS:
+        start, end = preset_range(preset, min_date, max_date)
+        freq, _ = trend_bucket(start, end)
+        def task():
+            date_slice(df, start, end)
+            dataset.cube.kpis(start, end)
+            dataset.cube.trend(start, end, freq)
+        results.append(measure(f'preset:{preset}', task, repeat, start=str(start), end=str(end)))
+
+    print("⏱️ 分析模式 (預設區間：最近 6 個月)")
+    start, end = preset_range(DATE_PRESETS[5], min_date, max_date)
+    keys, tasks = mode_tasks(dataset, start, end)
+    for stage, task in tasks:
+        results.append(measure(stage, task, repeat))
+
+    report = {
+        'meta': {'commit': git_commit(), 'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+                 'pandas': pd.__version__, 'numpy': np.__version__, 'machine': platform.platform(), 'cpus': os.cpu_count(),
+                 'data': data, 'rows': len(df), 'stores': int(df['店家名稱'].nunique()), 'repeat': repeat,
+                 'keys': {k: str(v) for k, v in keys.items()}},
+        'results': results,
+    }
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"📁 結果已寫入 {out}")
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    data = arg('data', 'bench_data')
+    repeat = int(arg('repeat', '3'))
+    if command == 'generate':
+        rows = int(arg('rows', '1000000'))
+        print(f"🏭 產生 {rows:,} 筆假資料到 {arg('out', 'bench_data')} ...")
+        generate(arg('out', 'bench_data'), rows, int(arg('stores', '3000')), int(arg('prefixes', '200')), int(arg('reps', '40')),
+                 seed=int(arg('seed', '0')), end=arg('end', '2026-03-18'), make_zip='--zip' in sys.argv, make_saler='--saler' in sys.argv)
+        print("✅ 完成")
+    elif command == 'run':
+        run(data, arg('out', 'bench_results.json'), repeat)
+    elif command == 'load-cold': child_load(data, 1, cold=True)
+    elif command == 'load-warm': child_load(data, repeat, cold=False)
+    elif command == 'export': child_export(data, 1)
+    else:
+        print("用法：python bench.py generate --rows=1000000 --out=bench_data [--zip] [--saler]")
+        print("      python bench.py run --data=bench_data --out=bench_results.json [--repeat=3]")
@@ -1,10 +1,16 @@
 import pandas as pd
-from dbfread import DBF, FieldParser
 import os
 import sys
+import json
+import glob
+import time
+import hashlib
+import numpy as np
+from dbf_reader import DbfFile
+from sales_data import PARTS_DIR_NAME, PART_PREFIX
 
 # 定義防彈解析器 (防止舊資料格式錯誤導致當機)
-class SafeParser(FieldParser):
+class SafeDbf(DbfFile):
     def parse(self, field, data):
         try:
             return super().parse(field, data)
@@ -13,60 +19,292 @@ class SafeParser(FieldParser):
         except Exception:
             return None
 
+# --- 🌊 串流寫檔器：一個分片一塊，記憶體只佔一塊的量 ---
+# chunk() 在解碼的 worker 裡就把分片轉成最後的格式 (CSV 文字 / Arrow 表)，主程序只負責照順序接到檔尾
+# 欄位型態一律看 DBF 欄位描述，不靠每塊自己推斷，數字格式才不會因為某塊剛好有空值而變 (1 → 1.0)
+# 例外：小數位數 0 的 N/F 欄偶爾會有 1.5 這種值 (DbfFile.parse 會退回 float)，那一塊就把該欄升成浮點數，不能把值丟掉
+def has_fraction(values):
+    return any(isinstance(v, float) and not v.is_integer() for v in values)
+
+class CsvChunkWriter:
+    def __init__(self, path, fields):
+        self.path = path
+        self.fields = fields
+        self.tmp = path + '.tmp'
+        self.f = None
+
+    @staticmethod
+    def _dtype(field):
+        if field.type in 'NF': return 'float64' if field.decimal_count else 'Int64'
+        if field.type in 'I+': return 'Int64'
+        if field.type in 'BY': return 'float64'
+        return object
+
+    @staticmethod
+    def _column(values, dtype):
+        if dtype == 'Int64' and has_fraction(values):
+            # 用 object 裝：整數照樣寫成 1，只有帶小數的值寫成 1.5，其他塊的格式不受影響
+            return pd.array([int(v) if isinstance(v, float) and v.is_integer() else v for v in values], dtype=object)
+        if dtype == 'Int64':
+            values = [int(v) if isinstance(v, int) or (isinstance(v, float) and v.is_integer()) else None for v in values]
+        elif dtype == 'float64':
+            values = [np.nan if v is None else float(v) for v in values]
+        return pd.array(values, dtype=dtype)
+
+    @classmethod
+    def chunk(cls, fields, columns):
+        frame = pd.DataFrame({f.name: cls._column(columns[f.name], cls._dtype(f)) for f in fields})
+        return frame.to_csv(index=False, header=False).encode('utf-8')
+
+    def write(self, chunk):
+        if self.f is None:
+            self.f = open(self.tmp, 'wb')
+            self.f.write(pd.DataFrame(columns=[f.name for f in self.fields]).to_csv(index=False).encode('utf-8-sig'))
+        self.f.write(chunk)
+
+    def close(self):
+        if self.f is None: return
+        self.f.close()
+        os.replace(self.tmp, self.path)
+
+class ParquetChunkWriter:
+    # 每個分片寫成一個 row group
+    def __init__(self, path, fields):
+        import pyarrow.parquet as pq
+        self.path = path
+        self.tmp = path + '.tmp'
+        self.schema = self._schema(fields)
+        self.writer = pq.ParquetWriter(self.tmp, self.schema)
+        self.rows = 0
+
+    @staticmethod
+    def _arrow_type(field):
+        import pyarrow as pa
+        if field.type in 'NF': return pa.float64() if field.decimal_count else pa.int64()
+        if field.type in 'I+': return pa.int64()
+        if field.type in 'BY': return pa.float64()
+        if field.type == 'D': return pa.date32()
+        if field.type in 'T@': return pa.timestamp('ms')
+        if field.type == 'L': return pa.bool_()
+        return pa.string()
+
+    @classmethod
+    def _schema(cls, fields):
+        import pyarrow as pa
+        return pa.schema([(f.name, cls._arrow_type(f)) for f in fields])
+
+    @staticmethod
+    def _column(values, arrow_type):
+        import pyarrow as pa
+        if pa.types.is_string(arrow_type):
+            values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+        elif pa.types.is_integer(arrow_type) and has_fraction(values):
+            return pa.array([float(v) if isinstance(v, (int, float)) else None for v in values], type=pa.float64())
+        elif pa.types.is_integer(arrow_type):
+            values = [int(v) if isinstance(v, int) or (isinstance(v, float) and v.is_integer()) else None for v in values]
+        elif pa.types.is_floating(arrow_type):
+            values = [float(v) if isinstance(v, (int, float)) else None for v in values]
+        return pa.array(values, type=arrow_type)
+
+    @classmethod
+    def chunk(cls, fields, columns):
+        import pyarrow as pa
+        schema = cls._schema(fields)
+        return pa.Table.from_arrays([cls._column(columns[f.name], t) for f, t in zip(fields, schema.types)], names=schema.names)
+
+    def write(self, chunk):
+        if chunk.schema != self.schema: self._promote(chunk.schema)
+        self.writer.write_table(chunk.cast(self.schema))
+        self.rows += chunk.num_rows
+
+    def _promote(self, schema):
+        # 某塊有欄位升成浮點數：整份檔的型態要一致，已寫出的 row group 一個一個轉型搬到新檔 (很少發生，記憶體仍只佔一個 row group)
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        promoted = pa.schema([(f.name, pa.float64() if pa.types.is_floating(g.type) else f.type) for f, g in zip(self.schema, schema)])
+        if promoted == self.schema: return
+        self.writer.close()
+        old_tmp, self.tmp = self.tmp, self.tmp + '.promoted'  # 換一個新檔名，不能邊讀邊寫同一個檔
+        self.schema, self.writer = promoted, pq.ParquetWriter(self.tmp, promoted)
+        old = pq.ParquetFile(old_tmp)
+        for i in range(old.num_row_groups):
+            self.writer.write_table(old.read_row_group(i).cast(promoted))
+        old.close()
+        os.remove(old_tmp)
+
+    def close(self):
+        self.writer.close()
+        if self.rows: os.replace(self.tmp, self.path)
+        else: os.remove(self.tmp)
+
 FILE_NAME = 'SALER2.DBF'
-OUTPUT_NAME = 'All_Sales_5Years.csv'  # <--- 檔名改成這個，對應剛才的戰情室程式
-
-print("🚀 正在啟動「全公司 5 年數據」濾網...")
-print("👉 目標：抓取 2020/01/01 至今，所有業務員的業績")
-print("⚠️ 注意：因為資料量變大，這次掃描會比較久，請耐心等待...")
-
-if not os.path.exists(FILE_NAME):
-    print(f"❌ 錯誤：找不到 {FILE_NAME}")
-    sys.exit()
-
-try:
-    table = DBF(
-        FILE_NAME, 
-        encoding='cp950', 
-        char_decode_errors='ignore', 
-        ignore_missing_memofile=True,
-        parserclass=SafeParser
-    )
-    
-    data = []
-    print(f"📂 正在掃描 {FILE_NAME} (這可能會花幾分鐘)...")
-    
-    count = 0
-    match_count = 0
-    
-    for i, record in enumerate(table):
-        if i % 100000 == 0 and i > 0:
-            print(f"   已掃描 {i} 筆原始資料... (目前找到 {match_count} 筆符合條件)")
-            
-        try:
-            # 抓取日期欄位
-            outdate = str(record.get('OUTDATE', ''))
-            
-            # --- 關鍵修改 ---
-            # 只要是 2020 年 1 月 1 日以後的單，全部都要！
-            if outdate >= '20200101':
-                data.append(record)
-                match_count += 1
-                
-        except Exception:
-            continue
-
-    if data:
-        print(f"📊 正在轉存 CSV (這步最吃記憶體，請稍候)...")
-        df = pd.DataFrame(data)
-        df.to_csv(OUTPUT_NAME, index=False, encoding='utf-8-sig')
-        print(f"\n✅ 大功告成！已抓出 2020-2026 共 {len(df)} 筆資料")
-        print(f"📁 檔案名稱：{OUTPUT_NAME}")
-        print("👉 請把這個 CSV 檔案丟進您的「公司戰情室」資料夾，取代舊檔！")
-    else:
-        print("\n⚠️ 奇怪，沒有找到 2020 年後的資料。")
-
-except Exception as e:
-    print(f"\n❌ 發生錯誤：{e}")
-
-os.system("pause")
\ No newline at end of file
+USE_PARQUET = '--parquet' in sys.argv
+INCREMENTAL = '--incremental' in sys.argv
+OUTPUT_EXT = '.parquet' if USE_PARQUET else '.csv'
+OUTPUT_NAME = 'All_Sales_5Years' + OUTPUT_EXT  # <--- 檔名改成這個，對應剛才的戰情室程式
+STATE_NAME = os.path.join(PARTS_DIR_NAME, '_export_state.json')
+SHARD_SLOTS = 50000  # 每個分片的記錄槽數，也是每次寫出的一塊；記憶體高峰只跟這個有關，跟 DBF 有幾年無關
+WORKERS = next((int(a.split('=', 1)[1]) for a in sys.argv if a.startswith('--workers=')), 1)
+
+def dbf_layout(path):
+    # 回傳 (表頭長度, 每筆長度, 目前實體記錄槽數)
+    t = DbfFile(path)
+    return t.headerlen, t.recordlen, t.slots
+
+def slot_digest(path, headerlen, recordlen, slot):
+    # 上次匯出的最後一筆原始位元組，用來確認 DBF 沒有被重整 (PACK) 或改寫
+    if slot < 0: return None
+    with open(path, 'rb') as f:
+        f.seek(headerlen + slot * recordlen)
+        return hashlib.blake2b(f.read(recordlen), digest_size=16).hexdigest()
+
+def load_state():
+    try:
+        with open(STATE_NAME, 'r', encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError): return None
+
+def save_state(headerlen, recordlen, slots, last_outdate, last_sourno):
+    os.makedirs(PARTS_DIR_NAME, exist_ok=True)
+    state = {
+        'headerlen': headerlen, 'recordlen': recordlen, 'slots': slots,
+        'anchor': slot_digest(FILE_NAME, headerlen, recordlen, slots - 1),
+        'last_outdate': last_outdate, 'last_sourno': last_sourno,
+    }
+    with open(STATE_NAME, 'w', encoding='utf-8') as f: json.dump(state, f, ensure_ascii=False)
+
+def open_table():
+    return SafeDbf(FILE_NAME, encoding='cp950', errors='ignore')
+
+def scan_shard(shard, writer_cls):
+    # 解碼一段記錄槽 [start, stop)，只留 2020 年以後的單，直接轉成 writer_cls 的格式 (process pool 會呼叫，必須放在最外層)
+    # 先只解碼日期欄挑出要的槽，其他欄位只解碼留下來的那些
+    # 回傳 (掃描筆數, 符合筆數, 格式化好的一塊, 這塊最後日期, 單號)
+    start_slot, stop_slot = shard
+    table = open_table()
+    slots, cols = table.decode(['OUTDATE'], start_slot, stop_slot)
+    if 'OUTDATE' not in cols: return len(slots), 0, None, None, None
+
+    # --- 關鍵修改 ---
+    # 只要是 2020 年 1 月 1 日以後的單，全部都要！
+    outdates = np.array([str(v) for v in cols['OUTDATE']], dtype=object)
+    keep = outdates >= '20200101'
+    if not keep.any(): return len(slots), 0, None, None, None
+    pos, kept = table.decode(start=start_slot, stop=stop_slot, slots=slots[keep])
+
+    # 最後日期取最大的那天，同一天取排在最後的那筆單號
+    outdates = outdates[keep]
+    last = len(outdates) - 1 - int(np.argmax(outdates[::-1] == outdates.max()))
+    sourno = str(kept['SOURNO'][last]) if 'SOURNO' in kept else ''
+    return len(slots), len(pos), writer_cls.chunk(table.fields, kept), outdates[last], sourno
+
+def iter_shards(start_slot, stop_slot, writer_cls, workers=1):
+    # 依記錄槽切成固定大小的分片；多核心時丟進 process pool，結果仍照原順序交回
+    shards = [(s, min(s + SHARD_SLOTS, stop_slot)) for s in range(start_slot, stop_slot, SHARD_SLOTS)]
+    if workers <= 1:
+        for shard in shards:
+            yield scan_shard(shard, writer_cls)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    from collections import deque
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for shard in shards:
+            pending.append(pool.submit(scan_shard, shard, writer_cls))
+            # 最多只讓 2 倍核心數的分片在途，記憶體才不會被跑在前面的分片撐爆
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def export_stream(shard_results, writer):
+    # 依序接收格式化好的分片 → 接到檔尾，回傳 (掃描筆數, 符合筆數, 最後日期, 最後單號)
+    scanned = match_count = 0
+    last_outdate = last_sourno = None
+    started = time.time()
+
+    for shard_scanned, kept, chunk, outdate, sourno in shard_results:
+        if (scanned + shard_scanned) // 100000 > scanned // 100000:
+            rate = (scanned + shard_scanned) / max(time.time() - started, 1e-9)
+            print(f"   已掃描 {scanned + shard_scanned} 筆原始資料... (目前找到 {match_count + kept} 筆符合條件，{rate:,.0f} 筆/秒)")
+        scanned += shard_scanned
+        if not kept: continue
+
+        writer.write(chunk)
+        match_count += kept
+        if last_outdate is None or outdate >= last_outdate:
+            last_outdate, last_sourno = outdate, sourno
+
+    writer.close()
+    return scanned, match_count, last_outdate, last_sourno
+
+if __name__ == '__main__':
+    print("🚀 正在啟動「全公司 5 年數據」濾網...")
+    print("👉 目標：抓取 2020/01/01 至今，所有業務員的業績")
+
+    if not os.path.exists(FILE_NAME):
+        print(f"❌ 錯誤：找不到 {FILE_NAME}")
+        sys.exit()
+
+    try:
+        headerlen, recordlen, slots = dbf_layout(FILE_NAME)
+        start_slot = 0
+
+        if INCREMENTAL:
+            state = load_state()
+            if not state:
+                print("❌ 找不到上次的匯出紀錄，請先不加 --incremental 跑一次完整匯出。")
+                sys.exit()
+            if (state['headerlen'], state['recordlen']) != (headerlen, recordlen) or slots < state['slots'] \
+                    or slot_digest(FILE_NAME, headerlen, recordlen, state['slots'] - 1) != state['anchor']:
+                print("❌ SALER2.DBF 結構或舊資料有變動 (可能被重整過)，增量無法接續，請重跑完整匯出。")
+                sys.exit()
+            start_slot = state['slots']
+            print(f"⚡ 增量模式：從第 {start_slot} 筆之後開始讀 (上次最後日期 {state['last_outdate']}，單號 {state['last_sourno']})")
+            if start_slot == slots:
+                print("\n✅ 沒有新資料，不需要更新。")
+                sys.exit()
+        else:
+            print("⚠️ 注意：因為資料量變大，這次掃描會比較久，請耐心等待...")
+
+        fields = open_table().fields
+
+        if INCREMENTAL:
+            os.makedirs(PARTS_DIR_NAME, exist_ok=True)
+            target = os.path.join(PARTS_DIR_NAME, f"{PART_PREFIX}{start_slot:010d}{OUTPUT_EXT}")
+        else:
+            target = OUTPUT_NAME
+        writer_cls = ParquetChunkWriter if USE_PARQUET else CsvChunkWriter
+        writer = writer_cls(target, fields)
+
+        print(f"📂 正在串流轉存 {FILE_NAME} → {target} (每塊 {SHARD_SLOTS} 筆，{WORKERS} 個核心解碼)...")
+        started = time.time()
+        scanned, match_count, last_outdate, last_sourno = export_stream(iter_shards(start_slot, slots, writer_cls, WORKERS), writer)
+        elapsed = max(time.time() - started, 1e-9)
+        print(f"⏱️ 共掃描 {scanned} 筆，耗時 {elapsed:.1f} 秒 ({scanned / elapsed:,.0f} 筆/秒)")
+
+        if INCREMENTAL:
+            if match_count:
+                print(f"\n✅ 增量完成！新增 {match_count} 筆資料")
+                print(f"📁 分區檔案：{target}")
+                print(f"👉 請把 {PARTS_DIR_NAME} 資料夾整個放在戰情室資料檔旁邊，系統會自動合併！")
+            else:
+                print("\n✅ 新增的紀錄都早於 2020 年，沒有需要匯出的資料。")
+            save_state(headerlen, recordlen, slots, last_outdate or state['last_outdate'], last_sourno or state['last_sourno'])
+
+        elif match_count:
+            # 完整匯出已包含全部資料，舊的增量分區作廢
+            for old_part in glob.glob(os.path.join(PARTS_DIR_NAME, f"{PART_PREFIX}*")):
+                os.remove(old_part)
+            save_state(headerlen, recordlen, slots, last_outdate, last_sourno)
+            print(f"\n✅ 大功告成！已抓出 2020-2026 共 {match_count} 筆資料")
+            print(f"📁 檔案名稱：{OUTPUT_NAME}")
+            print("👉 請把這個檔案丟進您的「公司戰情室」資料夾，取代舊檔！")
+            print("💡 之後每天只要執行 python clean_data.py --incremental 就能只匯出新增的單 (加 --parquet 改存欄式檔，加 --workers=4 用多核心解碼)。")
+        else:
+            print("\n⚠️ 奇怪，沒有找到 2020 年後的資料。")
+
+    except Exception as e:
+        print(f"\n❌ 發生錯誤：{e}")
+
+    os.system("pause")
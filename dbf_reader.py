@@ -0,0 +1,165 @@
+import os
+import mmap
+import struct
+import datetime
+from collections import namedtuple
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+
+# --- 📼 DBF 直讀器 ---
+# 整個檔案 mmap 進來，欄位描述只解析一次；只解碼要用的欄位，而且每欄只對不重複的原始位元組解碼一次
+# 解碼規則照 dbfread (C 去掉尾端空白與 \0、N 轉 int/float、D 轉 date...)；備註欄 (M/G/P) 不讀備註檔，一律 None
+DbfField = namedtuple('DbfField', ['name', 'type', 'length', 'decimal_count', 'offset'])
+MEMO_TYPES = 'MGP'
+JULIAN_OFFSET = 1721425  # DBF 的 Julian 日數 → Python 的 ordinal
+
+class DbfFile:
+    def __init__(self, path, encoding='cp950', errors='strict'):
+        self.path = path
+        self.encoding = encoding
+        self.errors = errors
+        with open(path, 'rb') as f:
+            head = f.read(32)
+            self.dbversion = head[0]
+            self.numrecords, self.headerlen, self.recordlen = struct.unpack('<IHH', head[4:12])
+            self.fields = []
+            offset = 1  # 每筆第一個位元組是刪除旗標
+            while True:
+                desc = f.read(32)
+                if len(desc) < 32 or desc[:1] in (b'\r', b'\n'): break
+                ftype, length, dec = chr(desc[11]), desc[16], desc[17]
+                if ftype == 'C':
+                    # 超過 255 的字元欄位，高位元組放在小數位數那格
+                    length, dec = length | dec << 8, 0
+                name = desc[:11].split(b'\0')[0].decode(encoding, errors=errors)
+                self.fields.append(DbfField(name, ftype, length, dec, offset))
+                offset += length
+        # 目前實體記錄槽數 (含已刪除的)，增量匯出靠這個判斷有沒有新記錄
+        self.slots = max(0, (os.path.getsize(path) - self.headerlen) // self.recordlen)
+
+    @property
+    def field_names(self):
+        return [f.name for f in self.fields]
+
+    def parse(self, field, data):
+        t = field.type
+        if t == 'C': return data.rstrip(b'\0 ').decode(self.encoding, errors=self.errors)
+        if t == 'N':
+            data = data.strip().strip(b'*')
+            try: return int(data)
+            except ValueError:
+                if not data.strip(): return None
+                return float(data.replace(b',', b'.'))
+        if t == 'F':
+            data = data.strip().strip(b'*')
+            return float(data) if data else None
+        if t == 'D':
+            try: return datetime.date(int(data[:4]), int(data[4:6]), int(data[6:8]))
+            except ValueError:
+                if data.strip(b' 0') == b'': return None
+                raise ValueError('invalid date {!r}'.format(data))
+        if t == 'L':
+            if data in b'TtYy': return True
+            if data in b'FfNn': return False
+            if data in b'? ': return None
+            raise ValueError('Illegal value for logical field: {!r}'.format(data))
+        if t in 'I+': return struct.unpack('<i', data)[0]
+        if t == 'O': return struct.unpack('d', data)[0]
+        if t == 'Y': return Decimal(struct.unpack('<q', data)[0]) / 10000
+        if t in 'T@':
+            if not data.strip(): return None
+            day, msec = struct.unpack('<LL', data)
+            if not day: return None
+            return datetime.datetime.fromordinal(day - JULIAN_OFFSET) + datetime.timedelta(seconds=msec / 1000)
+        if t == 'B' and self.dbversion in (0x30, 0x31, 0x32): return struct.unpack('d', data)[0]
+        if t in MEMO_TYPES or t == 'B': return None
+        if t == '0': return data
+        raise ValueError('Unknown field type: {!r}'.format(t))
+
+    def _decode(self, recs, field):
+        # 同一欄的原始位元組先去重，每個不重複值只解碼一次，再按位置展開
+        raw = np.ascontiguousarray(recs[:, field.offset:field.offset + field.length])
+        raw = raw.view(np.dtype((np.void, field.length))).ravel()
+        uniq, inverse = np.unique(raw, return_inverse=True)
+        values = np.empty(len(uniq), dtype=object)
+        for i, u in enumerate(uniq):
+            values[i] = self.parse(field, u.tobytes())
+        return values[inverse.ravel()]
+
+    def decode(self, columns=None, start=0, stop=None, slots=None):
+        # 回傳 (記錄槽編號, {欄名: 解碼後的 object 陣列})，只含未刪除的記錄；跟 dbfread 一樣讀到 0x1A (檔尾) 就停
+        fields = self.fields if columns is None else [f for f in self.fields if f.name in columns]
+        stop = self.slots if stop is None else min(stop, self.slots)
+        start = min(start, stop)
+        if stop == start: return np.empty(0, dtype=np.int64), {f.name: np.empty(0, dtype=object) for f in fields}
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = np.frombuffer(mm, dtype=np.uint8, count=(stop - start) * self.recordlen,
+                                 offset=self.headerlen + start * self.recordlen).reshape(-1, self.recordlen)
+            end = np.flatnonzero(view[:, 0] == 0x1a)
+            pos = np.flatnonzero(view[:end[0] if end.size else len(view), 0] == 0x20)
+            if slots is not None:
+                pos = np.intersect1d(pos, np.asarray(slots, dtype=np.int64) - start)
+            recs = view[pos]  # 挑出來的列複製一份，mmap 關掉後仍可用
+            del view
+        return pos + start, {field.name: self._decode(recs, field) for field in fields}
+
+    def read(self, columns=None, start=0, stop=None, slots=None):
+        # columns 只解碼這幾欄，slots 指定只讀哪些槽；index 是記錄槽編號，欄位型態推斷跟 pd.DataFrame(iter(DBF(...))) 相同
+        pos, data = self.decode(columns, start, stop, slots)
+        return pd.DataFrame({name: values.tolist() for name, values in data.items()}, index=pd.Index(pos, dtype=np.int64))
+
+# --- ✍️ DBF 寫檔 (只支援 C / N 欄位，給壓測產生假資料用) ---
+# fields 是 [(欄名, 型態, 長度, 小數位數)]，data 是 {欄名: 陣列}；每欄只對不重複值編碼一次，再按位置展開成整塊位元組
+def _encode_cells(values, ftype, length, dec, encoding):
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+    cells = np.full((len(uniques), length), 0x20, dtype=np.uint8)
+    for i, v in enumerate(uniques):
+        if v is None or (isinstance(v, float) and np.isnan(v)): continue
+        if ftype == 'N':
+            raw = f'{float(v):{length}.{dec}f}'.encode()[:length]
+        else:
+            text = str(v)
+            raw = text.encode(encoding, errors='replace')
+            while len(raw) > length:  # 截斷時不要切在雙位元組中間
+                text = text[:-1]
+                raw = text.encode(encoding, errors='replace')
+        cells[i, :len(raw)] = np.frombuffer(raw, dtype=np.uint8)
+    return cells[codes]
+
+class DbfWriter:
+    # 一批一批寫進去 (跟 clean_data.py 的 ChunkWriter 一樣)，close 時再把總筆數補回檔頭
+    def __init__(self, path, fields, encoding='cp950'):
+        self.fields = fields
+        self.encoding = encoding
+        self.recordlen = 1 + sum(length for _, _, length, _ in fields)
+        self.numrecords = 0
+        self.f = open(path, 'wb')
+        today = datetime.date.today()
+        self.f.write(struct.pack('<BBBBIHH20x', 0x03, today.year - 1900, today.month, today.day, 0, 32 + 32 * len(fields) + 1, self.recordlen))
+        for name, ftype, length, dec in fields:
+            self.f.write(struct.pack('<11sc4xBB14x', name.encode(encoding), ftype.encode(), length, dec))
+        self.f.write(b'\r')
+
+    def write(self, data, batch_rows=1 << 18):
+        total = len(data[self.fields[0][0]]) if self.fields else 0
+        for a in range(0, total, batch_rows):
+            b = min(total, a + batch_rows)
+            recs = np.full((b - a, self.recordlen), 0x20, dtype=np.uint8)  # 第一個位元組空白 = 未刪除
+            offset = 1
+            for name, ftype, length, dec in self.fields:
+                recs[:, offset:offset + length] = _encode_cells(data[name][a:b], ftype, length, dec, self.encoding)
+                offset += length
+            self.f.write(recs.tobytes())
+        self.numrecords += total
+
+    def close(self):
+        self.f.write(b'\x1a')
+        self.f.seek(4)
+        self.f.write(struct.pack('<I', self.numrecords))
+        self.f.close()
+
+def write_dbf(path, fields, data, encoding='cp950'):
+    writer = DbfWriter(path, fields, encoding)
+    writer.write(data)
+    writer.close()
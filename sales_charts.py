@@ -0,0 +1,50 @@
+import pandas as pd
+import plotly.express as px
+
+# --- 📉 圖表資料管線：點數有上限，手機不管選多長的區間，送出去的圖都一樣輕 ---
+TREND_MAX_POINTS = 200  # 趨勢圖最多幾個點，超過就改成每週、再超過就每月加總
+BAR_TOP_N = 20  # 長條圖只畫前幾名，其餘併成一條「其他」
+
+def trend_bucket(start, end):
+    # 回傳 (pandas 週期代碼, 標題用字)
+    days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    if days <= TREND_MAX_POINTS: return 'D', '每日'
+    if days <= TREND_MAX_POINTS * 7: return 'W', '每週'
+    return 'M', '每月'
+
+def top_n(table, value_col, label_col, n=BAR_TOP_N):
+    # table 要先依 value_col 由大到小排好
+    if len(table) <= n: return table
+    rest = table.iloc[n:]
+    other = pd.DataFrame({label_col: [f"其他 {len(rest)} 項"], value_col: [rest[value_col].sum()]})
+    return pd.concat([table.head(n)[[label_col, value_col]], other], ignore_index=True)
+
+def trend_figure(trend):
+    fig = px.line(trend, x='OUTDATE', y='金額', markers=True)
+
+    # 🌟 圖表防護鎖 (防誤觸變形)
+    fig.update_layout(
+        xaxis_title="日期",
+        yaxis_title="營收金額",
+        plot_bgcolor="rgba(240, 248, 255, 0.4)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        margin=dict(l=10, r=10, t=30, b=10),
+        dragmode=False # 禁用圖表拖曳平移
+    )
+    fig.update_xaxes(fixedrange=True) # 禁用 X 軸縮放
+    fig.update_yaxes(fixedrange=True) # 禁用 Y 軸縮放
+    fig.update_traces(line_color='#1ABC9C', line_width=3, marker=dict(size=6, color='#0E6655'))
+    return fig
+
+def ranking_figure(table):
+    fig = px.bar(top_n(table, '金額', '產品全名'), x='金額', y='產品全名', orientation='h', text_auto='.2s', color='金額', color_continuous_scale='Blues')
+
+    # 🌟 圖表防護鎖 (防誤觸變形)
+    fig.update_layout(
+        yaxis=dict(autorange="reversed"),
+        dragmode=False, # 禁用拖曳
+        margin=dict(l=10, r=10, t=30, b=10)
+    )
+    fig.update_xaxes(fixedrange=True) # 禁用 X 軸縮放
+    fig.update_yaxes(fixedrange=True) # 禁用 Y 軸縮放
+    return fig
@@ -0,0 +1,501 @@
+import pandas as pd
+from pandas.api.types import union_categoricals
+import numpy as np
+import os
+import json
+import io
+import codecs
+import hashlib
+import zipfile
+from contextlib import contextmanager
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from sales_dims import load_dimensions, attach_dimensions
+from sales_labels import CATEGORY_MAX_RATIO, factorize_text, label_column
+from sales_shared import publish_frame, attach_frame, generation_time, build_lock
+from sales_perf import span
+
+# --- 📦 快照設定 ---
+# 每次修改下方的欄位加工邏輯時請 +1，舊快照就會自動作廢重建
+SNAPSHOT_VERSION = 5
+CACHE_DIR_NAME = '.sales_cache'
+META_FILE = 'sales_snapshot.json'
+
+PARQUET_NAMES = ['All_Sales_5Years.parquet']
+ZIP_NAMES = ['All_Sales_5Years.zip', 'All_Sales_5years.zip', 'all_sales_5years.zip']
+CSV_NAMES = ['All_Sales_5Years.csv', 'All_Sales_2025_2026.csv']
+LABORER_NAMES = ['LABORER.DBF', 'laborer.dbf', '勞工.DBF', '勞工.dbf']
+CUST_NAMES = ['CUST.DBF', 'cust.dbf', '客戶.DBF']
+
+# clean_data.py --incremental 產生的每日增量分區，放在主檔旁邊的資料夾
+PARTS_DIR_NAME = 'All_Sales_5Years_parts'
+PART_PREFIX = 'part-'
+
+# 加工時新增的欄位，其餘都是 CSV 原始欄位
+DERIVED_COLUMNS = ['金額', '數量', '產品編號', '產品名稱', '產品全名', 'Prefix', 'ProdNum', 'CUST_KEY', 'SALES_KEY', '業務員', '店家名稱']
+
+# --- 🔍 資料來源解析 (一次走訪找齊所有檔案，結果連同指紋快取起來) ---
+SOURCE_NAMES = {'parquet': PARQUET_NAMES, 'zip': ZIP_NAMES, 'csv': CSV_NAMES, 'laborer': LABORER_NAMES, 'cust': CUST_NAMES}
+DATA_DIR_ENV = 'SALES_DATA_DIR'  # 設定這個環境變數就只在該資料夾底下找
+MANIFEST_FILE = 'sales_sources.json'  # 選用：{"data_dir": "...", "csv": "...", "cust": "..."} 直接指定位置
+SOURCES_FILE = 'sources.json'
+SOURCES_VERSION = 2  # 快取格式有變就換號，舊的快取直接作廢
+SEARCH_MAX_DEPTH = 4
+SEARCH_IGNORE_DIRS = {'__pycache__', 'node_modules', 'site-packages', 'venv', 'env'}  # 另外 . 開頭的資料夾也不進去
+
+def read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError): return None
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+def search_sources(root, roles):
+    # 一次 os.walk 同時比對所有角色的檔名，每個角色取走訪順序中第一個符合的；限制深度並略過肥大的資料夾
+    # 回傳 (paths, 走過的資料夾)，走過的資料夾都要記修改時間，之後才知道有沒有新放進去的檔
+    wanted = {role: {n.lower() for n in SOURCE_NAMES[role]} for role in roles}
+    found, walked = {}, []
+    base_depth = os.path.abspath(root).count(os.sep)
+    for dirpath, dirs, files in os.walk(root):
+        walked.append(os.path.abspath(dirpath))
+        if os.path.abspath(dirpath).count(os.sep) - base_depth >= SEARCH_MAX_DEPTH: dirs[:] = []
+        else: dirs[:] = [d for d in dirs if not d.startswith('.') and d not in SEARCH_IGNORE_DIRS]
+        for file in files:
+            low = file.lower()
+            for role, names in wanted.items():
+                if role not in found and low in names: found[role] = os.path.join(dirpath, file)
+        if len(found) == len(wanted): break
+    return {role: found.get(role) for role in roles}, walked
+
+def dir_stamps(dirs):
+    # 搜尋時走過的每個資料夾 (加上指定檔案所在的資料夾) 的修改時間；有檔案新增、刪除或改名時會變，快取就作廢重找
+    # 只記找到檔案的資料夾不夠：之後才放進既有子資料夾的檔 (例如原本缺的 CUST.DBF) 會永遠找不到
+    stamps = {}
+    for d in sorted(dirs):
+        try: stamps[d] = os.stat(d).st_mtime_ns
+        except OSError: stamps[d] = None
+    return stamps
+
+def resolve_sources():
+    # 回傳 (paths, prints)：只留一個主檔 (Parquet > ZIP > CSV)，其他主檔角色設為 None，其餘檔案變動就不影響快照
+    manifest = read_json(MANIFEST_FILE) or {}
+    root = os.environ.get(DATA_DIR_ENV) or manifest.get('data_dir') or '.'
+    explicit = {role: manifest[role] for role in SOURCE_NAMES if manifest.get(role) and os.path.isfile(manifest[role])}
+    cache_path = os.path.join(root, CACHE_DIR_NAME, SOURCES_FILE)
+    key = {'root': os.path.abspath(root), 'explicit': explicit, 'depth': SEARCH_MAX_DEPTH, 'version': SOURCES_VERSION}
+
+    cached = read_json(cache_path)
+    if cached and cached.get('key') == key and dir_stamps(cached['dirs']) == cached['dirs'] \
+            and all(os.path.isfile(p) for p in cached['paths'].values() if p):
+        paths, dirs = cached['paths'], list(cached['dirs'])
+    else:
+        cached = None
+        paths, walked = search_sources(root, [role for role in SOURCE_NAMES if role not in explicit])
+        paths.update(explicit)
+        dirs = set(walked) | {os.path.abspath(root)} | {os.path.dirname(os.path.abspath(p)) for p in explicit.values()}
+        for role in ('parquet', 'zip', 'csv'):
+            if paths[role] != main_source(paths): paths[role] = None
+
+    prints = fingerprint_sources(paths, cached['prints'] if cached else None)
+    if not cached or prints != cached['prints']:
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)  # 先建好快取資料夾，根目錄的修改時間才不會在記錄之後又變
+            write_json(cache_path, {'key': key, 'paths': paths, 'dirs': dir_stamps(dirs), 'prints': prints})
+        except OSError: pass
+    return paths, prints
+
+def main_source(paths):
+    return paths.get('parquet') or paths.get('zip') or paths.get('csv')
+
+def locate_partitions(paths):
+    parts_dir = os.path.join(os.path.dirname(os.path.abspath(main_source(paths))), PARTS_DIR_NAME)
+    if not os.path.isdir(parts_dir): return []
+    names = sorted(f for f in os.listdir(parts_dir) if f.startswith(PART_PREFIX) and f.lower().endswith(('.csv', '.parquet')))
+    return [os.path.join(parts_dir, f) for f in names]
+
+# --- 🧬 檔案指紋 (大小 + 修改時間 + 內容雜湊) ---
+def hash_file(path, chunk_size=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def fingerprint_file(path, old=None):
+    # 大小與修改時間都沒變就沿用上次的雜湊，避免每次開機都把整包 ZIP 讀一遍
+    st = os.stat(path)
+    fp = {'path': os.path.abspath(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    if old and all(old.get(k) == fp[k] for k in ('path', 'size', 'mtime_ns')):
+        fp['hash'] = old['hash']
+    else:
+        fp['hash'] = hash_file(path)
+    return fp
+
+def fingerprint_sources(paths, previous=None):
+    previous = previous or {}
+    return {role: fingerprint_file(path, previous.get(role)) if path else None for role, path in paths.items()}
+
+def fingerprint_partitions(parts, previous=None):
+    old_by_path = {fp['path']: fp for fp in (previous or [])}
+    return [fingerprint_file(p, old_by_path.get(os.path.abspath(p))) for p in parts]
+
+def _same_content(a, b):
+    if a is None or b is None: return a is b
+    return a['path'] == b['path'] and a['size'] == b['size'] and a['hash'] == b['hash']
+
+def source_signature(previous=None):
+    # 目前主檔、對照表與增量分區的指紋；大小與修改時間沒變就只花幾次 stat
+    paths, prints = resolve_sources()
+    if not main_source(paths): return None
+    parts = locate_partitions(paths)
+    return {'inputs': prints, 'parts': fingerprint_partitions(parts, previous['parts'] if previous else None)}
+
+def same_signature(a, b):
+    if a is None or b is None: return a is b
+    return set(a['inputs']) == set(b['inputs']) and all(_same_content(a['inputs'][r], b['inputs'][r]) for r in a['inputs']) \
+        and len(a['parts']) == len(b['parts']) and all(_same_content(x, y) for x, y in zip(a['parts'], b['parts']))
+
+# --- 💾 欄式快照 (每欄一個 .npy，memory-map 掛上去，多個行程共用；見 sales_shared.py) ---
+def snapshot_dir(paths):
+    return os.path.join(os.path.dirname(os.path.abspath(main_source(paths))), CACHE_DIR_NAME)
+
+def read_snapshot_meta(cache_dir):
+    meta = read_json(os.path.join(cache_dir, META_FILE))
+    return meta if isinstance(meta, dict) and meta.get('version') == SNAPSHOT_VERSION else None
+
+def write_snapshot_meta(cache_dir, meta):
+    write_json(os.path.join(cache_dir, META_FILE), meta)
+
+def load_snapshot(cache_dir, meta):
+    with span('load:snapshot_attach') as s:
+        df = attach_frame(cache_dir, meta['frame'])
+        s['rows'] = len(df)
+    return df
+
+def save_snapshot(cache_dir, df, meta):
+    # 先發佈新世代再改 meta，別的行程要嘛讀到舊的一整份、要嘛讀到新的一整份
+    with span('load:snapshot_write', rows=len(df)):
+        meta['frame'] = publish_frame(cache_dir, df)
+    write_snapshot_meta(cache_dir, meta)
+    return attach_frame(cache_dir, meta['frame'])
+
+# --- 📥 原始 CSV 讀取 (pyarrow 多執行緒解析，只讀加工用得到的欄位) ---
+# 品號 / 品名欄要看內容才知道是哪一欄，先拿開頭一小段當樣本挑好，整檔只解析這幾欄
+SALES_COLUMNS = ['OUTDATE', 'SUBTOT', 'OUTQTY', 'CUST_NO', 'SUBNO', 'SOURNO']
+NUMBER_COLUMNS = ['SUBTOT', 'OUTQTY']
+SNIFF_BYTES = 1 << 20  # 判斷編碼、挑欄位用的開頭樣本大小
+SAMPLE_ROWS = 10000  # Parquet 挑欄位用的樣本列數
+# 跟 pandas read_csv 預設認定的空值字樣一致
+NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+# 文字欄讀成字典編碼 (轉過來就是 category)：日期、品號、品名重複率很高，不必每列各放一個字串物件
+ARROW_TYPES = {str: pa.dictionary(pa.int32(), pa.string()), float: pa.float64()}
+
+def sniff_encoding(head):
+    # 開頭這段解得開 UTF-8 就用 UTF-8 (最後一個字可能被切斷，不算錯)，否則當 Big5 (cp950)
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(head)
+        return 'utf8'
+    except UnicodeDecodeError: return 'cp950'
+
+def pick_columns(sample):
+    # 回傳 (要讀的欄位, 指定型態)；編號類欄位 (SOURNO、CUST_NO、SUBNO) 不指定，跟以前一樣由內容決定是數字還是字串
+    code_col, name_col = detect_code_columns(sample)
+    columns = [c for c in sample.columns if c in SALES_COLUMNS or c in (code_col, name_col)]
+    types = {c: str for c in ('OUTDATE', code_col, name_col) if c in columns}
+    types.update({c: float for c in NUMBER_COLUMNS if c in columns and sample[c].dtype.kind in 'if'})
+    return columns, types
+
+def arrow_csv(source, encoding, columns=None, types=None):
+    convert = pa_csv.ConvertOptions(include_columns=columns or [], include_missing_columns=True, null_values=NA_VALUES, strings_can_be_null=True,
+                                    column_types={c: ARROW_TYPES[t] for c, t in (types or {}).items()})
+    table = pa_csv.read_csv(source, read_options=pa_csv.ReadOptions(encoding=encoding), convert_options=convert)
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    pa.default_memory_pool().release_unused()  # 解析用的緩衝區還給系統，不然會一直算在這個行程頭上
+    # Arrow 的字串空值轉過來是 None，改成跟 pandas 讀檔一樣的 NaN (後面 astype(str) 才會是 "nan")
+    for col in df.columns:
+        if df[col].dtype == object: df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+def csv_sample(head, encoding):
+    # 樣本切在最後一個換行，當成一個小檔解析
+    cut = head.rfind(b'\n')
+    return arrow_csv(io.BytesIO(head[:cut + 1] if cut >= 0 else head), encoding)
+
+def read_sales_csv(open_source, columns=None, types=None):
+    # open_source() 每次回傳一個新的二進位串流 (ZIP 成員是邊解壓邊讀、不能倒帶，重試就重開)；沒給欄位就用開頭樣本挑
+    with open_source() as f: head = f.read(SNIFF_BYTES)
+    encoding = sniff_encoding(head)
+    if columns is None:
+        try: columns, types = pick_columns(csv_sample(head, encoding))
+        except (pa.ArrowInvalid, UnicodeDecodeError): columns, types = None, None
+    try:
+        with open_source() as f: return arrow_csv(f, encoding, columns, types)
+    except (pa.ArrowInvalid, UnicodeDecodeError):
+        pass
+    # 樣本之後才出現的髒資料 (型態混雜、編碼不一致)：退回 pandas，兩種編碼輪流試，數字欄交給 to_numeric 處理
+    usecols = (lambda c: c in columns) if columns else None
+    dtype = {c: t for c, t in (types or {}).items() if t is str} or None
+    for enc in dict.fromkeys([encoding, 'utf8', 'cp950']):
+        try:
+            with open_source() as f: return pd.read_csv(f, encoding=enc, usecols=usecols, dtype=dtype, low_memory=False)
+        except UnicodeDecodeError as e: error = e
+    raise error
+
+@contextmanager
+def open_zip_member(zip_path, name):
+    # ZIP 裡的 CSV 不先整包解到記憶體，交給解析器邊解壓邊讀
+    with zipfile.ZipFile(zip_path, 'r') as z, z.open(name) as f:
+        yield f
+
+def read_parquet_projected(path, columns=None):
+    # clean_data.py --parquet 匯出的欄式檔已經帶型態，欄式格式可以直接只讀需要的欄
+    names = pq.read_schema(path).names
+    if columns is None:
+        sample = next(pq.ParquetFile(path).iter_batches(batch_size=SAMPLE_ROWS), None)
+        columns = pick_columns(sample.to_pandas())[0] if sample is not None else names
+    return pd.read_parquet(path, columns=[c for c in columns if c in names])
+
+def read_sales_source(paths):
+    parquet_path = paths.get('parquet')
+    zip_path = paths.get('zip')
+    csv_path = paths.get('csv')
+
+    df = None
+
+    if parquet_path:
+        df = read_parquet_projected(parquet_path)
+    elif zip_path:
+        try:
+            with zipfile.ZipFile(zip_path, 'r') as z:
+                valid_files = [f for f in z.namelist() if f.lower().endswith('.csv') and not f.startswith('__')]
+            if valid_files:
+                df = read_sales_csv(lambda: open_zip_member(zip_path, valid_files[0]))
+        except Exception as e:
+            return None, f"Zip 讀取失敗: {str(e)}"
+    elif csv_path:
+        df = read_sales_csv(lambda: open(csv_path, 'rb'))
+    else:
+        return None, "❌ 找不到資料檔 (CSV或ZIP)"
+
+    if df is None: return None, "讀取後資料為空"
+    return df, None
+
+def read_partition(path, like=None, start=0):
+    # 分區只讀主檔有的欄位，型態跟著主檔走 (主檔是字串的欄位就不要讓小檔自己猜成數字，免得前導 0 不見)
+    columns = list(like.columns) if like is not None else None
+    if path.lower().endswith('.parquet'):
+        part = read_parquet_projected(path, columns)
+    else:
+        types = {c: str if like[c].dtype.kind == 'O' else float for c in columns if like[c].dtype.kind in 'Of'} if like is not None else None
+        if types is not None and 'OUTDATE' in columns: types['OUTDATE'] = str
+        part = read_sales_csv(lambda: open(path, 'rb'), columns, types)
+    part.index = pd.RangeIndex(start, start + len(part))
+    return part
+
+# --- 🏷️ 產品代碼解析 (只對不重複值跑正則，再用位置編號貼回每一列) ---
+CODE_PATTERN = r"([a-zA-Z]{1,4})[\s-]*(\d{1,5})"
+SPLIT_PATTERN = r"([a-zA-Z]+)[\s-]*(\d+)"
+
+def extract_smart_codes(values):
+    # 回傳 (每列的編號, 每個編號的代碼)；代碼等同逐列 re.search(CODE_PATTERN, str(x).strip())，沒抓到就取前 5 個字
+    codes, texts = factorize_text(values)
+    texts = texts.str.strip()
+    m = texts.str.extract(CODE_PATTERN)
+    return codes, (m[0] + m[1]).where(m[0].notna(), texts.str[:5])
+
+def split_prod_codes(texts):
+    # 每個代碼等同 re.search(SPLIT_PATTERN, code) → (字首大寫, 整數編號)，沒抓到就是 ("N/A", 0)
+    m = texts.str.extract(SPLIT_PATTERN)
+    hit = m[0].notna()
+    prefix = m[0].str.upper().where(hit, "N/A")
+    num = m[1].where(hit, "0").map(int).astype('int64')
+    return prefix, num.to_numpy()
+
+def count_code_matches(values):
+    codes, texts = factorize_text(values)
+    return (texts.str.count(r'[a-zA-Z]+[\s-]*\d+').to_numpy() * np.bincount(codes, minlength=len(texts))).sum()
+
+def detect_code_columns(df):
+    best_code_col = None
+    priority_cols = [c for c in df.columns if c.upper() in ['IT_NO', 'ITEM_NO', 'P_NO', 'CODE', 'PROD_ID']]
+    if priority_cols: best_code_col = priority_cols[0]
+    else:
+        max_matches = 0
+        for col in df.select_dtypes(include=['object', 'category']).columns:
+            matches = count_code_matches(df[col])
+            if matches > max_matches: max_matches = matches; best_code_col = col
+
+    title_candidates = [c for c in df.columns if c.upper() in ['TITLE', 'NAME', 'PROD_NAME', 'DESCRIPTION', 'C_NAME']]
+    best_name_col = title_candidates[0] if title_candidates else best_code_col
+    return best_code_col, best_name_col
+
+# --- 🔥 數據加工引擎 (主檔與增量分區共用) ---
+def parse_dates(values):
+    # 字典編碼讀進來的日期 (category) 每個不重複日期只解析一次再按編號展開；直接丟給 to_datetime 會得到 category
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        days = pd.to_datetime(values.cat.categories, format='%Y%m%d', errors='coerce').to_numpy(dtype='datetime64[ns]')
+        return pd.Series(np.append(days, np.datetime64('NaT', 'ns'))[values.cat.codes.to_numpy()], index=values.index)  # 空值的編號是 -1，剛好取到 NaT
+    return pd.to_datetime(values, format='%Y%m%d', errors='coerce')
+
+def enrich_sales_frame(df, best_code_col, best_name_col, name_map, cust_map):
+    rows = len(df)
+    with span('load:parse_dates', rows=rows):
+        df['OUTDATE'] = parse_dates(df['OUTDATE'])
+        df = df.sort_values('OUTDATE')
+    with span('load:amounts', rows=rows):
+        df['金額'] = pd.to_numeric(df['SUBTOT'], errors='coerce').fillna(0)
+        df['數量'] = pd.to_numeric(df['OUTQTY'], errors='coerce').fillna(0)
+
+    with span('load:product_codes', rows=rows):
+        # 代碼、品名、全名都只對不重複值組字串，每列只留編號 (見 sales_labels)
+        if best_code_col: code_ids, codes = extract_smart_codes(df[best_code_col])
+        else: code_ids, codes = np.zeros(rows, dtype=np.intp), pd.Series(["Unknown"], dtype=object)
+
+        if best_name_col: name_ids, names = factorize_text(df[best_name_col])
+        else: name_ids, names = code_ids, codes
+        pair_ids, pairs = pd.factorize(code_ids.astype(np.int64) * len(names) + name_ids)
+        full_names = "[" + codes.to_numpy(dtype=object)[pairs // len(names)] + "] " + names.to_numpy(dtype=object)[pairs % len(names)]
+
+        df['產品編號'] = label_column(code_ids, codes)
+        df['產品名稱'] = label_column(name_ids, names)
+        df['產品全名'] = label_column(pair_ids, full_names)
+        prefixes, nums = split_prod_codes(codes)
+        df['Prefix'], df['ProdNum'] = label_column(code_ids, prefixes), nums[code_ids]
+
+    with span('load:join_names', rows=rows):
+        return attach_dimensions(df, name_map, cust_map)
+
+# --- 🗜️ 壓縮表示：重複字串轉 category、數字縮成夠用的型態 ---
+def compact_frame(df):
+    for col in df.columns:
+        if df[col].dtype == object and len(df) and df[col].nunique(dropna=False) < len(df) * CATEGORY_MAX_RATIO:
+            df[col] = df[col].astype('category')
+    # 金額、數量會被加總成營收與包數，float32 會讓大區間的總數跑掉尾數，維持 float64
+    df['ProdNum'] = df['ProdNum'].astype('int32')
+    return df
+
+def build_enriched_frame(paths, parts=()):
+    with span('load:read') as s:
+        df, err = read_sales_source(paths)
+        if df is None: return None, err, None
+        if parts:
+            df = pd.concat([df] + [read_partition(p, like=df) for p in parts], ignore_index=True)
+        s['rows'] = len(df)
+
+    with span('load:detect_codes', rows=len(df)):
+        best_code_col, best_name_col = detect_code_columns(df)
+    with span('load:dbf_dims'):
+        name_map, cust_map, cust_info_map = load_dimensions(paths)
+    df = enrich_sales_frame(df, best_code_col, best_name_col, name_map, cust_map)
+    with span('load:compact', rows=len(df)):
+        df = compact_frame(df)
+
+    state = {'code_col': best_code_col, 'name_col': best_name_col, 'raw_columns': [c for c in df.columns if c not in DERIVED_COLUMNS],
+             'name_map': name_map, 'cust_map': cust_map, 'cust_info_map': cust_info_map}
+    return df, cust_info_map, state
+
+def _union_categories(old, new):
+    # 類別照字母序合併 (跟整份重建時一樣)，舊列只換編號，不必重新掃一遍文字
+    new = new.array if isinstance(new.dtype, pd.CategoricalDtype) else pd.Categorical(new.to_numpy(dtype=object))
+    try: return union_categoricals([old.array, new], sort_categories=True)
+    except TypeError:
+        # 類別型態不一致 (例如文字 vs 數字) 就都當 object，排不了序就照出現順序
+        old, new = (pd.Categorical.from_codes(c.codes, categories=c.categories.astype(object)) for c in (old.array, new))
+        try: return union_categoricals([old, new], sort_categories=True)
+        except TypeError: return union_categoricals([old, new])
+
+def append_rows(df, new):
+    # 把新列接在壓縮過的表後面：category 欄只擴充類別，其他欄直接接上；不重跑 compact_frame，花費只跟新列數有關
+    cols = {}
+    for col in df.columns:
+        old, add = df[col], new[col]
+        if isinstance(old.dtype, pd.CategoricalDtype): cols[col] = _union_categories(old, add)
+        elif old.dtype == object: cols[col] = np.concatenate([old.to_numpy(), add.to_numpy(dtype=object)])
+        else: cols[col] = pd.concat([old, add], ignore_index=True).to_numpy()
+    out = pd.DataFrame(cols, index=df.index.append(new.index), copy=False)
+    out['ProdNum'] = out['ProdNum'].astype('int32')
+    return out
+
+def merge_partitions(df, parts, state):
+    # 只加工新分區，舊資料直接沿用快照；新列通常都比快照晚，直接接在後面，只有日期插到中間時才整份重排 (穩定排序保持原本順序)
+    base = df.iloc[:0][state['raw_columns']]  # 只拿來看欄名與型態，不複製整份
+    new_parts = []
+    start = len(df)
+    for p in parts:
+        part = read_partition(p, like=base, start=start)
+        if part.empty: continue
+        start += len(part)
+        new_parts.append(enrich_sales_frame(part, state['code_col'], state['name_col'], state['name_map'], state['cust_map']))
+    with span('load:merge_partitions', rows=start - len(df)):
+        if not new_parts: return df
+        new = pd.concat(new_parts).sort_values('OUTDATE', kind='stable')
+        last, first = (df['OUTDATE'].iloc[-1] if len(df) else None), new['OUTDATE'].iloc[0]
+        in_order = last is None or (pd.notna(last) and (pd.isna(first) or first >= last))  # 空值 (NaT) 一定要留在最後
+        merged = append_rows(df, new)
+        return merged if in_order else merged.sort_values('OUTDATE', kind='stable')
+
+def load_last_snapshot():
+    # 不管來源有沒有變，直接把上次的快照讀回來，回傳 (df, cust_info_map, 當時的指紋, 快照建立時間)；背景更新期間先頂著用
+    try:
+        paths, _ = resolve_sources()
+        if not main_source(paths): return None
+        cache_dir = snapshot_dir(paths)
+        meta = read_snapshot_meta(cache_dir)
+        if not meta: return None
+        built_at = generation_time(cache_dir, meta['frame'])
+        return load_snapshot(cache_dir, meta), meta['state']['cust_info_map'], {'inputs': meta['inputs'], 'parts': meta['parts']}, built_at
+    except Exception:
+        return None
+
+def reuse_snapshot(cache_dir, prints, parts, merge=True):
+    # 主檔與對照表都沒變：memory-map 掛上快照，只補上還沒併進去的新分區；不能沿用就回傳 None
+    meta = read_snapshot_meta(cache_dir)
+    if not meta or not all(_same_content(prints[r], meta['inputs'].get(r)) for r in prints): return None
+    part_prints = fingerprint_partitions(parts, meta['parts'])
+    done = meta['parts']
+    if len(done) > len(part_prints) or not all(_same_content(a, b) for a, b in zip(part_prints, done)): return None
+    if len(done) < len(part_prints) and not merge: return None
+    try:
+        df = load_snapshot(cache_dir, meta)
+        changed = prints != meta['inputs'] or part_prints != done
+        meta['inputs'], meta['parts'] = prints, part_prints
+        if len(done) < len(part_prints):
+            df = merge_partitions(df, parts[len(done):], meta['state'])
+            try: df = save_snapshot(cache_dir, df, meta)
+            except Exception: pass
+        elif changed:
+            try: write_snapshot_meta(cache_dir, meta)
+            except OSError: pass
+        return df, meta['state']['cust_info_map']
+    except Exception: return None
+
+def load_sales_data():
+    try:
+        paths, prints = resolve_sources()
+        if not main_source(paths):
+            return None, "❌ 找不到資料檔 (CSV或ZIP)"
+        parts = locate_partitions(paths)
+        cache_dir = snapshot_dir(paths)
+
+        # 🚀 快照可以直接用：不用搶鎖，每個行程各自掛上同一份
+        result = reuse_snapshot(cache_dir, prints, parts, merge=False)
+        if result: return result
+
+        # 🐢 要寫快照 (補分區或完整重建) 時只讓一個行程做；等到鎖時別的行程可能已經建好了，先再看一次
+        with build_lock(cache_dir):
+            result = reuse_snapshot(cache_dir, prints, parts)
+            if result: return result
+            df, cust_info_map, state = build_enriched_frame(paths, parts)
+            if df is None: return df, cust_info_map
+            part_prints = fingerprint_partitions(parts)
+            try: df = save_snapshot(cache_dir, df, {'version': SNAPSHOT_VERSION, 'inputs': prints, 'parts': part_prints, 'state': state})
+            except Exception: pass
+            return df, cust_info_map
+
+    except Exception as e:
+        return None, str(e)
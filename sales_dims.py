@@ -0,0 +1,94 @@
+import pandas as pd
+import numpy as np
+from dbf_reader import DbfFile
+from sales_labels import label_column
+
+# --- 📇 業務員 / 店家對照表 (LABORER.DBF, CUST.DBF) ---
+LABORER_ID_COLS = ['SUBNO', 'SNO', 'S_NO', 'ID', 'K_NO']
+LABORER_NAME_COLS = ['NAME', 'NAME_C', 'L_NAME', 'SNAME']
+CUST_ID_COLS = ['CUST_NO', 'CNO', 'C_NO', 'K_NO', 'ID', 'CODE']
+CUST_NAME_COLS = ['C_NA', 'NAME', 'C_NAME', 'COMPANY', 'CUST_NAME', 'TITLE']
+TEL_COLS = ['TELE1', 'TELE2', 'TEL1', 'TEL2', 'COMP_TEL', 'CON_TEL', 'TEL']
+ADDR_COLS = ['CARADD', 'INVOADD', 'SEND_ADDR', 'INVOICE_AD', 'C_ADDR1', 'C_ADDR']
+
+BLANK_TEXTS = ["nan", "None", "NaN", ""]
+NO_RECORD = "系統無紀錄"
+
+def pick_column(columns, names):
+    return next((c for c in columns if c.upper() in names), None)
+
+def key_table(values):
+    # 回傳 (每列的編號, 每個編號的鍵)；鍵等同逐列 super_clean：空值變 "None"，其餘 str() 後去空白、去掉結尾的 .0
+    codes, uniques = pd.factorize(values)
+    keys = pd.Series(uniques, dtype=object).map(str).str.strip().str.removesuffix('.0')
+    if (codes < 0).any(): keys = pd.Series(np.append(keys.to_numpy(dtype=object), "None"), dtype=object)  # 空值的編號是 -1，剛好取到最後的 "None"
+    return codes, keys
+
+def clean_keys(values):
+    codes, keys = key_table(values)
+    return keys.to_numpy()[codes]
+
+def coalesce_text(df, cols):
+    # 依欄位順序取第一個不是空白的值，全空就是「系統無紀錄」
+    out = pd.Series(NO_RECORD, index=df.index, dtype=object)
+    for col in reversed(cols):
+        val = df[col].astype(str).str.strip()
+        out = val.where(~val.isin(BLANK_TEXTS), out)
+    return out
+
+def load_laborers(path):
+    table = DbfFile(path, errors='ignore')
+    id_col, name_col = pick_column(table.field_names, LABORER_ID_COLS), pick_column(table.field_names, LABORER_NAME_COLS)
+    if not (id_col and name_col): return {}
+    l_df = table.read([id_col, name_col])
+    keys = clean_keys(l_df[id_col])
+    names = l_df[name_col].to_numpy(dtype=object)
+    # 同一個編號同時登記原樣與補滿 4 碼兩種寫法，銷售檔哪一種都對得到
+    return {**dict(zip(keys, names)), **dict(zip(pd.Series(keys, dtype=object).str.zfill(4), names))}
+
+def load_customers(path):
+    table = DbfFile(path, errors='replace')
+    id_col, name_col = pick_column(table.field_names, CUST_ID_COLS), pick_column(table.field_names, CUST_NAME_COLS)
+    if not (id_col and name_col): return {}, {}
+    tel_cols = [c for c in table.field_names if c.upper() in TEL_COLS]
+    addr_cols = [c for c in table.field_names if c.upper() in ADDR_COLS]
+    # 只解碼用得到的欄位 (編號、店名、電話、地址)，其他幾十個欄位不碰
+    c_df = table.read([id_col, name_col] + tel_cols + addr_cols)
+    names = c_df[name_col].astype(str).str.strip()
+    cust_map = dict(zip(clean_keys(c_df[id_col]), names))
+
+    tel = coalesce_text(c_df, tel_cols)
+    addr = coalesce_text(c_df, addr_cols)
+    keep = ~names.isin(BLANK_TEXTS)
+    cust_info_map = {n: {"電話": t, "地址": a} for n, t, a in zip(names[keep], tel[keep], addr[keep])}
+    return cust_map, cust_info_map
+
+def load_dimensions(paths):
+    name_map, cust_map, cust_info_map = {}, {}, {}
+    if paths.get('laborer'):
+        try: name_map = load_laborers(paths['laborer'])
+        except: pass
+    if paths.get('cust'):
+        try: cust_map, cust_info_map = load_customers(paths['cust'])
+        except: pass
+    return name_map, cust_map, cust_info_map
+
+# --- 🔗 銷售明細貼上業務員 / 店家名稱 (對不重複的編號查一次，再按位置展開) ---
+def lookup_names(keys, mapping, zfill=False):
+    # keys 是 key_table 的鍵表，查不到的就顯示編號本身
+    names = keys.map(mapping).fillna(keys)
+    if zfill:
+        # 原樣查不到的，再用補滿 4 碼的編號查一次
+        miss = names == keys
+        names[miss] = keys[miss].str.zfill(4).map(mapping).fillna(keys[miss])
+    return names
+
+def attach_dimensions(df, name_map, cust_map):
+    # 鍵與名稱都掛在編號上，每列不另外存字串
+    cust_codes, cust_keys = key_table(df['CUST_NO'])
+    sales_codes, sales_keys = key_table(df['SUBNO'])
+    df['CUST_KEY'] = label_column(cust_codes, cust_keys)
+    df['SALES_KEY'] = label_column(sales_codes, sales_keys)
+    df['業務員'] = label_column(sales_codes, lookup_names(sales_keys, name_map, zfill=True))
+    df['店家名稱'] = label_column(cust_codes, lookup_names(cust_keys, cust_map))
+    return df
@@ -0,0 +1,294 @@
+import re
+import pandas as pd
+import numpy as np
+
+# --- 📅 快速跳轉的日期區間 (畫面與壓測共用) ---
+DATE_PRESETS = [
+    "最近 7 天", "最近 30 天", "本月", "上個月",
+    "最近 3 個月", "最近 6 個月", "最近 9 個月",
+    "今年以來 (YTD)", "去年全年度", "近 3 年", "全部 5 年"
+]
+
+def preset_range(preset, min_date, max_date):
+    if preset == "最近 7 天":
+        return max_date - pd.Timedelta(days=7), max_date
+    elif preset == "最近 30 天":
+        return max_date - pd.Timedelta(days=30), max_date
+    elif preset == "本月":
+        return max_date.replace(day=1), max_date
+    elif preset == "上個月":
+        end_d = max_date.replace(day=1) - pd.Timedelta(days=1)
+        return end_d.replace(day=1), end_d
+    elif preset == "最近 3 個月":
+        return (pd.to_datetime(max_date) - pd.DateOffset(months=3)).date(), max_date
+    elif preset == "最近 6 個月":
+        return (pd.to_datetime(max_date) - pd.DateOffset(months=6)).date(), max_date
+    elif preset == "最近 9 個月":
+        return (pd.to_datetime(max_date) - pd.DateOffset(months=9)).date(), max_date
+    elif preset == "今年以來 (YTD)":
+        return pd.Timestamp(f"{max_date.year}-01-01").date(), max_date
+    elif preset == "去年全年度":
+        return pd.Timestamp(f"{max_date.year-1}-01-01").date(), pd.Timestamp(f"{max_date.year-1}-12-31").date()
+    elif preset == "近 3 年":
+        return (pd.to_datetime(max_date) - pd.DateOffset(years=3)).date(), max_date
+    return min_date, max_date
+
+# --- ✂️ 日期區間切片 ---
+# 資料載入時已按 OUTDATE 排好序 (NaT 在最後)，直接二分搜尋取連續區段，不必每次把整欄轉成 date 再比
+# start / end 是含頭含尾的日期，None 代表不設限；回傳的是原表的位置切片
+def date_span(df, start=None, end=None):
+    t = df['OUTDATE'].to_numpy()
+    a = 0 if start is None else t.searchsorted(pd.Timestamp(start).to_datetime64(), side='left')
+    if end is None:
+        b = t.searchsorted(np.datetime64('NaT'), side='left')
+    else:
+        b = t.searchsorted((pd.Timestamp(end).normalize() + pd.Timedelta(days=1)).to_datetime64(), side='left')
+    return int(a), int(max(a, b))
+
+def date_slice(df, start=None, end=None):
+    a, b = date_span(df, start, end)
+    return df.iloc[a:b]
+
+# --- 🗂️ 店家 / 業務員 分組索引 ---
+# 載入時把每個店家、每位業務的列位置排好 (同組內仍照日期順序)，點選單一店家或業務時只碰那幾列
+# category 欄直接沿用原本的編號 (共用快照裡就是 mmap 的那份，不另佔記憶體)；位置與區段都存 int32
+class GroupIndex:
+    def __init__(self, df, cols=('店家名稱', '業務員')):
+        self.codes, self.lookup, self.positions, self.offsets = {}, {}, {}, {}
+        index_type = np.int32 if len(df) < 2 ** 31 else np.int64
+        for col in cols:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                codes, uniques = df[col].cat.codes.to_numpy(), df[col].cat.categories
+            else:
+                codes, uniques = pd.factorize(df[col])
+                codes = codes.astype(index_type)
+            order = np.argsort(codes, kind='stable')
+            skip = int((codes < 0).sum())  # 空值排在最前面，不會被任何鍵選到
+            self.codes[col] = codes
+            self.lookup[col] = {v: i for i, v in enumerate(uniques)}
+            self.positions[col] = order[skip:].astype(index_type)
+            self.offsets[col] = np.concatenate([[0], np.cumsum(np.bincount(codes[codes >= 0], minlength=len(uniques)))]).astype(index_type)
+
+    def _code_list(self, col, key):
+        keys = key if isinstance(key, (list, tuple, set, np.ndarray)) else [key]
+        return [self.lookup[col][k] for k in keys if k in self.lookup[col]]
+
+    def _rows(self, col, key, a, b):
+        parts = []
+        for code in self._code_list(col, key):
+            pos = self.positions[col][self.offsets[col][code]:self.offsets[col][code + 1]]
+            parts.append(pos[pos.searchsorted(a):pos.searchsorted(b)])
+        if not parts: return np.empty(0, dtype=np.intp)
+        return parts[0] if len(parts) == 1 else np.sort(np.concatenate(parts))
+
+    # keys 例如 {'業務員': '王小明', '店家名稱': ['XX寵物', 'YY寵物']}；先取列數最少的那組，其餘條件只在這幾列上比對
+    def select(self, df, keys, start=None, end=None):
+        # 不限日期時連 OUTDATE 空白的列也要算進來，跟直接比對欄位一樣
+        a, b = (0, len(df)) if start is None and end is None else date_span(df, start, end)
+        cands = [(col, self._rows(col, key, a, b)) for col, key in keys.items()]
+        cands.sort(key=lambda c: len(c[1]))
+        col, pos = cands[0]
+        for other, key in keys.items():
+            if other != col:
+                pos = pos[np.isin(self.codes[other][pos], self._code_list(other, key))]
+        return df.iloc[pos]
+
+# --- 🧾 進貨單索引 (店家 × 日期 × 單號) ---
+# 載入時把明細按 (店家, 日期, 單號) 排好，同一張單的明細位置連在一起 (單內仍照原本的列順序)
+# 只存排好的列位置與每張單的範圍 (int32)；表頭 (日期、單號、店家、業務員、金額) 查詢時才從共用的明細表取那家店的幾張單
+class OrderIndex:
+    def __init__(self, df):
+        index_type = np.int32 if len(df) < 2 ** 31 else np.int64
+        store, stores = pd.factorize(df['店家名稱'])
+        sourno = self._sourno_rank(df['SOURNO'])
+        day = df['OUTDATE'].to_numpy()
+        pos = np.flatnonzero((store >= 0) & (sourno >= 0) & ~np.isnat(day))  # 跟 groupby 一樣略過空值
+        rows = pos[np.lexsort((sourno[pos], day[pos], store[pos]))]
+        s, t, n = store[rows], day[rows], sourno[rows]
+        new = np.ones(len(rows), dtype=bool)
+        new[1:] = (s[1:] != s[:-1]) | (t[1:] != t[:-1]) | (n[1:] != n[:-1])
+        starts = np.flatnonzero(new)
+        self.rows = rows.astype(index_type)
+        self.bounds = np.append(starts, len(rows)).astype(index_type)
+        self.store_lookup = {v: i for i, v in enumerate(stores)}
+        self.store_bounds = s[starts].searchsorted(np.arange(len(stores) + 1)).astype(index_type)
+
+    @staticmethod
+    def _sourno_rank(values):
+        # 編號大小 = 單號排序；合併了型態不同的分區時單號可能數字、文字混在一起 (5 跟 '5')，排不了就都當文字，同一張單才不會拆成兩張
+        kinds = values.cat.categories if isinstance(values.dtype, pd.CategoricalDtype) else values
+        if pd.api.types.infer_dtype(kinds, skipna=True).startswith('mixed'):
+            values = values.astype(str).where(values.notna())
+        return pd.factorize(values, sort=True)[0]
+
+    def _headers(self, df, a, b):
+        # 第 a ~ b-1 張單的表頭，index 是單的編號
+        heads = self.rows[self.bounds[a:b]]
+        lines = self.rows[self.bounds[a]:self.bounds[b]]
+        order = np.repeat(np.arange(a, b), np.diff(self.bounds[a:b + 1]))
+        return pd.DataFrame({
+            'OUTDATE': df['OUTDATE'].iloc[heads].to_numpy(), 'SOURNO': df['SOURNO'].iloc[heads].to_numpy(),
+            '店家名稱': df['店家名稱'].iloc[heads].to_numpy(), '業務員': df['業務員'].iloc[heads].to_numpy(),
+            # 用 groupby 加總，金額跟直接對明細 groupby 的結果一模一樣
+            '金額': pd.Series(df['金額'].to_numpy()[lines]).groupby(order).sum().to_numpy(),
+        }, index=np.arange(a, b))
+
+    def invoices(self, df, store, start=None, end=None):
+        # 該店家區間內的進貨單表頭，新到舊 (同一天照單號)；index 是單的編號，拿去 items() 取明細
+        code = self.store_lookup.get(store)
+        a, b = (0, 0) if code is None else (int(self.store_bounds[code]), int(self.store_bounds[code + 1]))
+        t = df['OUTDATE'].to_numpy()[self.rows[self.bounds[a:b]]]
+        lo = 0 if start is None else t.searchsorted(pd.Timestamp(start).to_datetime64(), side='left')
+        hi = len(t) if end is None else t.searchsorted((pd.Timestamp(end).normalize() + pd.Timedelta(days=1)).to_datetime64(), side='left')
+        return self._headers(df, a + lo, a + max(lo, hi)).sort_values('OUTDATE', ascending=False, kind='stable')
+
+    def items(self, df, order):
+        return df.iloc[self.rows[self.bounds[order]:self.bounds[order + 1]]]
+
+# --- 🔎 店名 / 品名 關鍵字索引 ---
+# 只對不重複的名稱建 bigram 倒排表，關鍵字先換成候選名稱，再用跟 str.contains 一樣的 regex 驗證
+# 關鍵字含 regex 符號、或有非 ASCII 的大小寫字母時，改成直接掃不重複名稱，結果保證跟原本一致
+REGEX_CHARS = set('.^$*+?{}[]\\|()')
+
+def _plain_case(text):
+    return all(ch.isascii() or ch.lower() == ch.upper() for ch in text)
+
+def _grams(text):
+    return {text} if len(text) == 1 else {text[i:i + 2] for i in range(len(text) - 1)}
+
+class TextIndex:
+    def __init__(self, values):
+        self.names = np.array([v for v in pd.unique(values.dropna()) if isinstance(v, str)], dtype=object)
+        self.postings, self.always = {}, []
+        for i, name in enumerate(self.names):
+            if not _plain_case(name):
+                self.always.append(i)  # 少見的全形/外文大小寫字母，每次都直接驗證
+                continue
+            low = name.lower()
+            for g in {low[j:j + 1] for j in range(len(low))} | _grams(low):
+                self.postings.setdefault(g, []).append(i)
+
+    def match(self, kw, case=True):
+        if REGEX_CHARS & set(kw) or not _plain_case(kw):
+            hit = pd.Series(self.names, dtype=object).str.contains(kw, case=case, na=False).to_numpy()
+            return self.names[hit].tolist()
+        lists = sorted((self.postings.get(g, []) for g in _grams(kw.lower())), key=len)
+        cand = set(lists[0]).intersection(*lists[1:]) if lists else set(range(len(self.names)))
+        pat = re.compile(kw, 0 if case else re.IGNORECASE)
+        return [self.names[i] for i in sorted(cand.union(self.always)) if pat.search(self.names[i])]
+
+# --- 🧊 每日彙總 (每日總量 + 每日店家位元圖 + 每日單數) ---
+# 營運總覽的 KPI 與趨勢圖直接查這裡，不必每次重跑原始明細
+class DailyCube:
+    def __init__(self, df):
+        d = df[df['OUTDATE'].notna()]
+        day = d['OUTDATE'].dt.normalize()
+
+        # 每日總量直接由明細加總，趨勢圖的浮點數才會跟逐筆加總一模一樣
+        daily = d.groupby(day).agg(金額=('金額', 'sum'), 數量=('數量', 'sum'), 筆數=('金額', 'size'))
+        self.days = daily.index
+        self.amount = daily['金額'].to_numpy()
+        self.qty = daily['數量'].to_numpy()
+        self.rows = daily['筆數'].to_numpy()
+
+        # 成交店數：每天一條店家位元圖，任意區間 OR 起來就是精確的不重複店數
+        # 直接由明細編號 (factorize 不管欄位是不是 category 都能用)，不另外留一份 日期 × 店家 的彙總表
+        store_codes, stores = pd.factorize(d['店家名稱'])
+        day_pos = self.days.get_indexer(day)
+        present = np.zeros((len(self.days), len(stores)), dtype=bool)
+        ok = store_codes >= 0
+        present[day_pos[ok], store_codes[ok]] = True
+        self.store_bits = np.packbits(present, axis=1)
+
+        # 成交單數：單號幾乎都只出現在一天，先按天加總；跨天的單另外記下來扣掉重複
+        orders = pd.DataFrame({'day': day.to_numpy(), 'SOURNO': d['SOURNO'].to_numpy()}).dropna().drop_duplicates()
+        self.orders = orders.groupby('day').size().reindex(self.days, fill_value=0).to_numpy()
+        multi = orders[orders.duplicated('SOURNO', keep=False)]
+        self.multi_day = multi['SOURNO'].to_numpy()
+        self.multi_pos = self.days.get_indexer(multi['day'])
+
+    def _span(self, start, end):
+        a = self.days.searchsorted(pd.Timestamp(start), side='left')
+        b = self.days.searchsorted(pd.Timestamp(end), side='right')
+        return a, max(a, b)
+
+    def has_rows(self, start, end):
+        a, b = self._span(start, end)
+        return bool(self.rows[a:b].sum())
+
+    def kpis(self, start, end):
+        # 回傳 (營收, 包數, 成交店數, 成交單數)，與對原始明細做 sum / nunique 的結果相同
+        a, b = self._span(start, end)
+        store_count = int(np.unpackbits(np.bitwise_or.reduce(self.store_bits[a:b], axis=0)).sum()) if b > a else 0
+        in_range = (self.multi_pos >= a) & (self.multi_pos < b)
+        repeated = in_range.sum() - pd.unique(self.multi_day[in_range]).size
+        return self.amount[a:b].sum(), self.qty[a:b].sum(), store_count, int(self.orders[a:b].sum() - repeated)
+
+    def trend(self, start, end, freq='D'):
+        a, b = self._span(start, end)
+        trend = pd.DataFrame({'OUTDATE': self.days[a:b], '金額': self.amount[a:b]})
+        if freq == 'D': return trend
+        # 每週 / 每月加總，日期標在該週週一、該月 1 號
+        return trend.groupby(trend['OUTDATE'].dt.to_period(freq).dt.start_time)['金額'].sum().reset_index()
+
+# --- 💲 近一年價目表 ---
+# 平均單價是整數就用平均，不是整數代表有混到搭贈或折扣，改用最近一筆的單價；數量 <= 0 一律 0
+def price_rule(table, last_col):
+    qty, amt = table['數量'].to_numpy(), table['金額'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg = amt / qty
+        price = np.where(qty <= 0, 0, np.where(np.abs(avg - np.round(avg)) > 0.01, table[last_col].to_numpy(), np.round(avg)))
+    return price.astype(np.int64)
+
+# 每次載入資料時算一次最近 12 個月的 (業務員, 店家, 產品) 加總、最新單價與參考單價
+# 全店家總表與店家的「近一年總結」只是在這張表上篩選，不再回頭掃原始明細
+class PriceBook:
+    def __init__(self, df):
+        self.since = df['OUTDATE'].max() - pd.DateOffset(years=1)
+        one = date_slice(df, self.since)
+        store_key, item_key = ['店家名稱', '產品全名'], ['業務員', '店家名稱', '產品全名']
+        self.pairs = one[['業務員', '店家名稱']].drop_duplicates()  # 含空值，給下拉選單與有無資料判斷用
+
+        self.store_items = one.groupby(store_key, observed=True)[['數量', '金額']].sum().reset_index()
+        self.store_items['最新單價'] = self._latest(one, store_key, self.store_items)
+        self.store_items['參考單價'] = price_rule(self.store_items, '最新單價')
+
+        self.items = one.groupby(item_key, observed=True).agg(
+            數量=('數量', 'sum'), 金額=('金額', 'sum'), 最後叫貨日=('OUTDATE', 'max')
+        ).reset_index()
+        self.items['最新單價'] = self._latest(one, store_key, self.items)
+        self.items['業務最新單價'] = self._latest(one, item_key, self.items)  # 只看該業務自己賣的最近一筆
+        self.items['參考單價'] = price_rule(self.items, '最新單價')
+
+    @staticmethod
+    def _latest(one, keys, target):
+        # one 已按日期排序，每組最後一列就是最近一筆 (同一天多筆取最後一列)
+        last = one.drop_duplicates(keys, keep='last')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            unit = (last['金額'] / last['數量']).fillna(0).round(0).replace([np.inf, -np.inf], 0)
+        return target[keys].merge(last[keys].assign(最新單價=unit), on=keys, how='left')['最新單價'].fillna(0).to_numpy()
+
+    def _pairs(self, rep=None, store=None):
+        p = self.pairs
+        if rep is not None: p = p[p['業務員'] == rep]
+        if store is not None: p = p[p['店家名稱'] == store]
+        return p
+
+    def has_rows(self, rep=None, store=None):
+        return not self._pairs(rep, store).empty
+
+    def reps(self):
+        return sorted(self.pairs['業務員'].astype(str).unique().tolist())
+
+    def stores(self, rep=None):
+        return sorted(self._pairs(rep)['店家名稱'].astype(str).unique().tolist())
+
+    def store_summary(self, store):
+        return self.store_items[self.store_items['店家名稱'] == store]
+
+    def table(self, rep=None, store=None):
+        t = self.items
+        if rep is not None: t = t[t['業務員'] == rep]
+        if store is not None: t = t[t['店家名稱'] == store]
+        # 指定業務時，最新單價只看這位業務的紀錄
+        return t.assign(參考單價=price_rule(t, '業務最新單價')) if rep is not None else t
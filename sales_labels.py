@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+# --- 🏷️ 標籤層：每列只存整數編號，顯示用的文字每個不重複值只做一份 ---
+# 產品全名、店家名稱這類字串不必每列各做一個再重新雜湊成 category，直接用 (編號, 對照文字) 組出來
+CATEGORY_MAX_RATIO = 0.5  # 不重複值佔比低於這個才轉 category (單號這種幾乎不重複的就不轉)
+
+def factorize_text(values):
+    # 回傳 (每列的編號, 不重複值的 str() 結果)；None 與 NaN 轉字串後不一樣，要分開編號
+    codes, uniques = pd.factorize(values)
+    texts = pd.Series(uniques, dtype=object).map(str)
+    na = codes < 0
+    if na.any():
+        na_codes, na_texts = pd.factorize(values[na].map(str))
+        codes[na] = na_codes + len(texts)
+        texts = pd.concat([texts, pd.Series(na_texts, dtype=object)], ignore_index=True)
+    return codes, texts
+
+def label_column(codes, texts):
+    # (每列編號, 每個編號對應的文字) → 跟逐列做出字串再 astype('category') 一樣的結果 (類別依字串排序、文字相同的編號併成一類)
+    cats, inverse = np.unique(np.asarray(texts, dtype=object), return_inverse=True)
+    codes = inverse[codes]
+    if len(codes) and len(cats) < len(codes) * CATEGORY_MAX_RATIO: return pd.Categorical.from_codes(codes, cats)
+    return cats[codes]
+
+def date_cn(outdate):
+    # 中文日期標籤不整欄存：畫面要顯示的列才算，而且每個日期只 strftime 一次
+    codes, days = pd.factorize(outdate)
+    labels = np.append(pd.DatetimeIndex(days).strftime('%Y年%m月%d日').to_numpy(dtype=object), np.nan)  # 空日期的編號是 -1，剛好取到 NaN
+    return pd.Series(labels[codes], index=outdate.index, dtype=object)
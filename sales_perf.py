@@ -0,0 +1,83 @@
+import os
+import time
+import json
+import threading
+from collections import deque, defaultdict
+from contextlib import contextmanager
+import numpy as np
+
+# --- 🩺 效能量測 (具名計時區段 + 記憶體) ---
+# with span('load:read') as s: ...; s['rows'] = len(df)  → 記下耗時、處理筆數、RSS 與前後差
+# 設 SALES_PERF=0 就整個關掉 (span 只剩一次判斷)；設 SALES_PERF_LOG=路徑 會另外逐筆追加成 JSON Lines 方便離線分析
+ENABLED = os.environ.get('SALES_PERF', '1') != '0'
+LOG_PATH = os.environ.get('SALES_PERF_LOG')
+KEEP_EVENTS = 5000  # 記憶體裡保留最近幾筆明細 (給匯出用)
+KEEP_PER_NAME = 1000  # 每個區段保留最近幾筆耗時 (算 p50 / p95 用)
+
+_lock = threading.Lock()
+_events = deque(maxlen=KEEP_EVENTS)
+_samples = defaultdict(lambda: deque(maxlen=KEEP_PER_NAME))
+_page = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def rss_mb():
+    # Linux 直接讀 /proc/self/statm (很便宜)；其他平台沒有就回傳 None
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _page / (1 << 20)
+    except (OSError, ValueError, IndexError):
+        return None
+
+def record(name, seconds, rows=None, rss_before=None):
+    if not ENABLED: return
+    rss = rss_mb()
+    event = {'time': round(time.time(), 3), 'name': name, 'ms': round(seconds * 1000, 2), 'rows': rows,
+             'rss_mb': round(rss, 1) if rss is not None else None,
+             'rss_delta_mb': round(rss - rss_before, 1) if rss is not None and rss_before is not None else None}
+    with _lock:
+        _events.append(event)
+        _samples[name].append((seconds, rows))
+        if LOG_PATH:
+            try:
+                with open(LOG_PATH, 'a', encoding='utf-8') as f: f.write(json.dumps(event, ensure_ascii=False) + '\n')
+            except OSError: pass
+
+@contextmanager
+def span(name, rows=None):
+    info = {'rows': rows}
+    if not ENABLED:
+        yield info
+        return
+    before = rss_mb()
+    t = time.perf_counter()
+    try:
+        yield info
+    finally:
+        record(name, time.perf_counter() - t, info['rows'], before)
+
+def timed(name, fn):
+    with span(name):
+        return fn()
+
+def summary():
+    # 每個區段：次數、p50 / p95 / 最大耗時 (毫秒)、最近一次處理筆數
+    with _lock:
+        samples = {name: list(s) for name, s in _samples.items()}
+    rows = []
+    for name in sorted(samples):
+        secs = np.array([s for s, _ in samples[name]]) * 1000
+        last_rows = next((r for _, r in reversed(samples[name]) if r is not None), None)
+        rows.append({'區段': name, '次數': len(secs), 'p50 (ms)': round(float(np.percentile(secs, 50)), 1),
+                     'p95 (ms)': round(float(np.percentile(secs, 95)), 1), '最大 (ms)': round(float(secs.max()), 1), '處理筆數': last_rows})
+    return rows
+
+def events():
+    with _lock:
+        return list(_events)
+
+def export_log():
+    return '\n'.join(json.dumps(e, ensure_ascii=False) for e in events())
+
+def reset():
+    with _lock:
+        _events.clear()
+        _samples.clear()
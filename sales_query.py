@@ -0,0 +1,68 @@
+import sys
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+# --- 🧠 查詢結果快取 (所有連線共用) ---
+# key = (資料版本, 畫面名稱, 參數...)，值是算好的彙總表；用量超過上限就從最久沒用的開始丟
+# 同一個 key 同時有好幾個人要時只算一次，其他人等它算完直接拿
+QUERY_CACHE_MB = 256
+
+def result_size(obj):
+    if isinstance(obj, (pd.DataFrame, pd.Series)): return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, (tuple, list)): return sys.getsizeof(obj) + sum(result_size(x) for x in obj)
+    if hasattr(obj, 'to_plotly_json'): return len(obj.to_json())  # 圖表以送出去的 JSON 大小計
+    return sys.getsizeof(obj)
+
+class QueryCache:
+    def __init__(self, max_mb=QUERY_CACHE_MB):
+        self.max_bytes = max_mb << 20
+        self.entries = OrderedDict()  # key → (結果, 大小)
+        self.pending = {}  # key → 正在算的 Event
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, compute):
+        # 回傳的結果是共用的，呼叫端不可以直接改 (要加欄位先 copy)
+        while True:
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return self.entries[key][0]
+                waiting = self.pending.get(key)
+                if waiting is None:
+                    self.pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+            waiting.wait()
+            # 算的那個人出錯就沒有結果，輪到自己算
+        try:
+            result = compute()
+            self.put(key, result)
+            return result
+        finally:
+            with self.lock:
+                self.pending.pop(key).set()
+
+    def put(self, key, result):
+        size = result_size(result)
+        if size > self.max_bytes: return
+        with self.lock:
+            if key in self.entries: self.bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (result, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, old) = self.entries.popitem(last=False)
+                self.bytes -= old
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'mb': round(self.bytes / (1 << 20), 1), 'hits': self.hits, 'misses': self.misses}
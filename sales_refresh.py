@@ -0,0 +1,104 @@
+import time
+import threading
+from collections import namedtuple
+from sales_data import load_sales_data, load_last_snapshot, source_signature, same_signature
+from sales_index import DailyCube, GroupIndex, OrderIndex, PriceBook, TextIndex
+from sales_query import QueryCache
+from sales_perf import span, timed
+
+# --- 🔄 背景更新服務 ---
+# 背景執行緒負責載入與重建，畫面永遠只讀目前這一份；來源檔有變時在背景建好新的一份，再整份換上去
+REFRESH_INTERVAL = 60  # 幾秒檢查一次來源檔指紋
+FIRST_LOAD_TIMEOUT = 600  # 第一次載入最多讓畫面等幾秒，超過就報錯 (背景照樣繼續載入)
+
+Dataset = namedtuple('Dataset', ['df', 'cust_info_map', 'cube', 'groups', 'search', 'book', 'orders', 'signature', 'built_at', 'loaded_at'])
+
+def build_dataset(df, cust_info_map, signature, built_at):
+    # 營運總覽用的每日彙總、店家/業務分組、關鍵字索引、近一年價目表與進貨單索引，跟資料表綁在同一份
+    rows = len(df)
+    with span('index:TextIndex', rows=rows):
+        search = {col: TextIndex(df[col]) for col in ('店家名稱', '產品全名')}
+    with span('index:DailyCube', rows=rows): cube = DailyCube(df)
+    with span('index:GroupIndex', rows=rows): groups = GroupIndex(df)
+    with span('index:PriceBook', rows=rows): book = PriceBook(df)
+    with span('index:OrderIndex', rows=rows): orders = OrderIndex(df)
+    return Dataset(df, cust_info_map, cube, groups, search, book, orders, signature, built_at, time.time())
+
+def format_age(seconds):
+    if seconds < 60: return "剛剛"
+    if seconds < 3600: return f"{int(seconds // 60)} 分鐘前"
+    if seconds < 86400: return f"{int(seconds // 3600)} 小時前"
+    return f"{int(seconds // 86400)} 天前"
+
+class RefreshService:
+    def __init__(self, interval=REFRESH_INTERVAL):
+        self.interval = interval
+        self.current = None
+        self.error = None
+        self.refreshing = False
+        self.last_check = None
+        self.queries = QueryCache()  # 各畫面的彙總結果，所有連線共用
+        self.first_attempt = threading.Event()
+        threading.Thread(target=self._run, daemon=True, name='sales-refresh').start()
+
+    def wait(self, timeout=FIRST_LOAD_TIMEOUT):
+        # 只有第一次啟動、手上還沒有任何一份資料時才需要等；等不到就丟 TimeoutError 讓畫面顯示
+        if not self.first_attempt.wait(timeout):
+            raise TimeoutError(f"資料載入超過 {timeout} 秒仍未完成，請稍後重新整理頁面")
+        return self.current
+
+    def _run(self):
+        # 先把上次的快照讀回來頂著，再檢查來源有沒有變
+        # 不管哪一步出錯，第一輪跑完一定放行 wait()，錯誤留在 self.error 給畫面顯示
+        try:
+            try:
+                last = load_last_snapshot()
+                if last is not None:
+                    df, cust_info_map, signature, built_at = last
+                    self.current = build_dataset(df, cust_info_map, signature, built_at)
+                    self.first_attempt.set()
+            except Exception as e:
+                self.error = str(e)
+            self.refresh_if_changed()
+        finally:
+            self.first_attempt.set()
+        while True:
+            time.sleep(self.interval)
+            self.refresh_if_changed()
+
+    def refresh_if_changed(self):
+        try:
+            current = self.current
+            signature = timed('refresh:check', lambda: source_signature(current.signature if current else None))
+            self.last_check = time.time()
+            if signature is not None and current is not None and same_signature(signature, current.signature): return
+            self.refreshing = True
+            with span('refresh:load') as s:
+                df, info = load_sales_data()
+                s['rows'] = len(df) if df is not None else None
+            if df is None:
+                self.error = info
+                return
+            # 整份換上去 (單一參照指派)，正在跑的畫面繼續用舊的那份，下一次重跑就拿到新的
+            self.current = build_dataset(df, info, signature, time.time())
+            self.queries.clear()  # 舊版本的結果不會再有人用到
+            self.error = None
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.refreshing = False
+
+    def status(self):
+        now = time.time()
+        current = self.current
+        return {
+            'state': 'refreshing' if self.refreshing else ('ready' if current else 'loading'),
+            'rows': len(current.df) if current else 0,
+            'snapshot_built_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(current.built_at)) if current else None,
+            'snapshot_age_seconds': round(now - current.built_at, 1) if current else None,
+            'swapped_in_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(current.loaded_at)) if current else None,
+            'last_check_seconds_ago': round(now - self.last_check, 1) if self.last_check else None,
+            'refresh_interval_seconds': self.interval,
+            'query_cache': self.queries.stats(),
+            'error': self.error,
+        }
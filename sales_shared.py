@@ -0,0 +1,105 @@
+import os
+import time
+import pickle
+import shutil
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+import numpy as np
+import pandas as pd
+
+# --- 🤝 共用資料集 (多個連線、多個 app 行程共用同一份記憶體) ---
+# 數字、日期欄與 category 的編號各存成一個 .npy，用 mmap 唯讀掛上去：每個行程都直接讀作業系統的同一份分頁快取，不會各複製一份
+# 只有 category 的不重複值、少數沒轉 category 的文字欄要各自載入 (小)；每次發佈都是一個新世代資料夾，正在讀舊世代的行程不受影響
+SHARED_DIR_NAME = 'shared'
+FRAME_FILE = 'frame.pkl'
+KEEP_GENERATIONS = 2  # 保留最新兩個世代，剛換版時還掛在上一版的行程不會讀到一半被刪
+BUILD_LOCK_FILE = 'build.lock'
+BUILD_LOCK_POLL = 0.5
+
+def _mappable(dtype):
+    return isinstance(dtype, np.dtype) and dtype.kind in 'biufM'
+
+def publish_frame(root, df):
+    # 寫成新的世代資料夾，回傳資料夾名稱 (寫進快照 meta)
+    name = f"{time.time_ns():x}-{os.getpid()}"
+    base = os.path.join(root, SHARED_DIR_NAME)
+    tmp = os.path.join(base, name + '.tmp')
+    os.makedirs(tmp, exist_ok=True)
+    columns = []
+    for i, col in enumerate(df.columns):
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(tmp, f'c{i}.npy'), s.cat.codes.to_numpy())
+            columns.append((col, 'category', (s.cat.categories, s.cat.ordered)))
+        elif _mappable(s.dtype):
+            np.save(os.path.join(tmp, f'c{i}.npy'), s.to_numpy())
+            columns.append((col, 'array', None))
+        else:
+            columns.append((col, 'object', s.to_numpy()))
+    if _mappable(df.index.dtype) and not isinstance(df.index, pd.RangeIndex):
+        np.save(os.path.join(tmp, 'index.npy'), df.index.to_numpy())
+        index = None
+    else:
+        index = df.index
+    with open(os.path.join(tmp, FRAME_FILE), 'wb') as f:
+        pickle.dump({'columns': columns, 'index': index, 'rows': len(df)}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, os.path.join(base, name))
+    prune_generations(root, keep=name)
+    return name
+
+def attach_frame(root, name):
+    # 不複製資料：各欄直接是 mmap 陣列的 view (唯讀)，要改就先 copy
+    path = os.path.join(root, SHARED_DIR_NAME, name)
+    with open(os.path.join(path, FRAME_FILE), 'rb') as f:
+        spec = pickle.load(f)
+    data = {}
+    for i, (col, kind, extra) in enumerate(spec['columns']):
+        if kind == 'object':
+            data[col] = extra
+            continue
+        values = np.load(os.path.join(path, f'c{i}.npy'), mmap_mode='r')
+        if kind == 'category':
+            categories, ordered = extra
+            data[col] = pd.Categorical.from_codes(values, categories=categories, ordered=ordered)
+        else:
+            data[col] = values
+    index = spec['index'] if spec['index'] is not None else pd.Index(np.load(os.path.join(path, 'index.npy'), mmap_mode='r'), copy=False)
+    # copy=False 時 pandas 不合併同型態的欄位，每欄各自保持 mmap 的 view
+    return pd.DataFrame(data, index=index, columns=[c for c, _, _ in spec['columns']], copy=False)
+
+def generation_time(root, name):
+    return os.path.getmtime(os.path.join(root, SHARED_DIR_NAME, name, FRAME_FILE))
+
+def prune_generations(root, keep):
+    # Windows 上還被別的行程 mmap 著的檔案刪不掉，那就留到下次再清
+    base = os.path.join(root, SHARED_DIR_NAME)
+    names = sorted((n for n in os.listdir(base) if n != keep), key=lambda n: os.path.getmtime(os.path.join(base, n)), reverse=True)
+    for n in names[KEEP_GENERATIONS - 1:]:
+        shutil.rmtree(os.path.join(base, n), ignore_errors=True)
+
+# --- 🔒 建檔鎖：同時開好幾個 app 行程時，只讓一個去重建，其他的等它寫好直接掛上去 ---
+def _try_lock(fd):
+    try:
+        if fcntl: fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else: msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+@contextmanager
+def build_lock(root):
+    # 用作業系統的檔案鎖 (flock / Windows 的 msvcrt.locking)：建檔再久都一直握著，行程掛掉時系統自動放開，不必靠時間猜
+    # 鎖檔本身一直留著不刪，刪掉的話等待中的行程可能鎖到已經被刪的舊檔
+    os.makedirs(root, exist_ok=True)
+    fd = os.open(os.path.join(root, BUILD_LOCK_FILE), os.O_CREAT | os.O_RDWR)
+    try:
+        while not _try_lock(fd):
+            time.sleep(BUILD_LOCK_POLL)
+        yield
+    finally:
+        os.close(fd)  # 關檔就放開鎖
+